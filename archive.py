@@ -0,0 +1,96 @@
+"""
+archive.py
+Baselines for the members of tar and zip archives, without extracting them.
+
+Each member becomes an entry keyed "<archive path>!/<member name>" with an
+"archive" field naming the archive. Tar archives (plain, gz, bz2, xz) are
+read as one forward stream, hashing every member as it passes; zip members
+are read in the order they are stored, so the file is also read front to
+back. Verification groups entries by archive and checks all of an archive's
+members in a single pass.
+"""
+
+import os
+import tarfile
+import zipfile
+import zlib
+
+import io_sched
+from hash_engine import BLOCK_SIZE, entry_algos, hash_fileobj
+
+ARCHIVE_EXTS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz", ".zip")
+MEMBER_SEP = "!/"
+# What a truncated or corrupt archive can raise while streaming
+ARCHIVE_ERRORS = (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile, zlib.error)
+
+def is_archive(path):
+    return str(path).lower().endswith(ARCHIVE_EXTS)
+
+def member_name(name):
+    # "tar -C dir ." stores "./a"; key members the same however they were added
+    while name.startswith("./"):
+        name = name[2:]
+    return name
+
+def member_path(archive, name):
+    return archive + MEMBER_SEP + member_name(name)
+
+def abs_member_path(path):
+    """Make the archive part of "ARCHIVE!/MEMBER" absolute, leaving the member name as is."""
+    archive, _, name = path.partition(MEMBER_SEP)
+    return member_path(os.path.abspath(archive), name)
+
+def iter_members(archive, algos, threaded=False):
+    """Yield (member name, size, {algo: hexdigest}) for every regular file in ``archive``."""
+    with open(archive, "rb") as raw:
+        io_sched.advise_open(raw.fileno())
+        if archive.lower().endswith(".zip"):
+            with zipfile.ZipFile(raw) as zf:
+                for info in sorted(zf.infolist(), key=lambda i: i.header_offset):
+                    if info.is_dir():
+                        continue
+                    with zf.open(info) as f:
+                        block = io_sched.read_size(info.file_size, BLOCK_SIZE)
+                        yield member_name(info.filename), info.file_size, hash_fileobj(f, algos, block, threaded)
+        else:
+            # "r|*": forward-only stream, any compression; members must be consumed in order
+            with tarfile.open(fileobj=raw, mode="r|*") as tf:
+                for member in tf:
+                    if not member.isfile():
+                        continue
+                    f = tf.extractfile(member)
+                    block = io_sched.read_size(member.size, BLOCK_SIZE)
+                    yield member_name(member.name), member.size, hash_fileobj(f, algos, block, threaded)
+        io_sched.advise_done(raw.fileno())
+
+def generate_archive_entries(archive, algos, threaded=False):
+    """Baseline entries for every member of ``archive``, from one read of it."""
+    archive = os.path.abspath(archive)
+    return [
+        {"path": archive + MEMBER_SEP + name, "archive": archive, **digests, "size": size}
+        for name, size, digests in iter_members(archive, algos, threaded)
+    ]
+
+def verify_archive(archive, entries, threaded=False):
+    """Return [(path, status)] for the member ``entries`` of one archive, reading it once.
+
+    A member listed twice in a tar is judged by its last copy, as extraction
+    would leave it. Members no longer in the archive are MISSING; if the
+    archive cannot be read, the members not yet seen are ERROR.
+    """
+    prefix = len(archive) + len(MEMBER_SEP)
+    expected = {entry["path"][prefix:]: entry for entry in entries}
+    algos = sorted({algo for entry in entries for algo in entry_algos(entry)})
+    statuses = {}
+    if not os.path.exists(archive):
+        return [(entry["path"], "MISSING") for entry in entries]
+    try:
+        for name, _size, digests in iter_members(archive, algos, threaded):
+            entry = expected.get(name)
+            if entry is not None:
+                match = all(digests[a] == entry[a] for a in entry_algos(entry))
+                statuses[name] = "ORIGINAL" if match else "MODIFIED"
+        missing = "MISSING"
+    except ARCHIVE_ERRORS:
+        missing = "ERROR"
+    return [(entry["path"], statuses.get(name, missing)) for name, entry in expected.items()]
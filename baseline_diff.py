@@ -0,0 +1,93 @@
+"""
+baseline_diff.py
+Compare two baselines without touching the filesystem.
+
+The old baseline is indexed into a {path: digest} dict and the new one is
+streamed past it, so modified files are reported as soon as they are seen.
+Once the new side is exhausted, additions whose digest matches a removed file
+are paired up as moves/renames; the rest are reported as added or removed.
+"""
+
+import itertools
+from collections import defaultdict, deque
+
+# Digest used as the content key, most preferred first
+KEY_PREFERENCE = ["sha256", "blake2b", "sha512", "sha3_256", "blake2s", "sha1", "md5", "crc32"]
+
+def pick_key_algo(old_algos, new_algos):
+    """Most preferred digest that every entry on both sides carries."""
+    for algo in KEY_PREFERENCE:
+        if algo in old_algos and algo in new_algos:
+            return algo
+    raise ValueError("baselines share no digest algorithm recorded for every entry "
+                     "(mixed algorithm sets?)")
+
+def _index_old(entries):
+    # {path: {algo: digest}} for the algos every old entry has; digests that
+    # stop being common are dropped as soon as an entry lacks them
+    common = None
+    index = {}
+    for entry in entries:
+        algos = {algo for algo in KEY_PREFERENCE if entry.get(algo)}
+        if common is None or not algos >= common:
+            common = algos if common is None else common & algos
+            for digests in index.values():
+                for algo in list(digests):
+                    if algo not in common:
+                        del digests[algo]
+        index[entry["path"]] = {algo: entry[algo] for algo in common}
+    return index, common or set()
+
+def diff_baselines(old_entries, new_entries, key_algo=None):
+    """Yield one change dict per difference, then a final {"summary": {...}}.
+
+    Changes have "status" ADDED, REMOVED, MODIFIED or MOVED (same content,
+    different path); unchanged files are not reported. The content key is
+    the most preferred digest every old entry and the first new entry carry;
+    a new entry without it raises ValueError, as do baselines with no digest
+    in common.
+    """
+    index, old_algos = _index_old(old_entries)
+    new_iter = iter(new_entries)
+    new_first = next(new_iter, None)
+    if key_algo is None and (index or new_first):
+        new_algos = {algo for algo in KEY_PREFERENCE if new_first.get(algo)} if new_first else old_algos
+        key_algo = pick_key_algo(old_algos if index else new_algos, new_algos)
+    new_iter = itertools.chain([new_first] if new_first else [], new_iter)
+
+    counts = {"ADDED": 0, "REMOVED": 0, "MODIFIED": 0, "MOVED": 0, "UNCHANGED": 0}
+    old = {path: digests.get(key_algo) for path, digests in index.items()}
+    del index
+    added = []
+    for entry in new_iter:
+        path = entry["path"]
+        digest = entry.get(key_algo)
+        if key_algo and not digest:
+            raise ValueError(f"{path} in the new baseline has no {key_algo} digest (mixed algorithm sets)")
+        if path not in old:
+            added.append((path, digest))
+            continue
+        old_digest = old.pop(path)
+        if old_digest == digest:
+            counts["UNCHANGED"] += 1
+            continue
+        counts["MODIFIED"] += 1
+        yield {"status": "MODIFIED", "path": path, "old": old_digest, "new": digest}
+
+    # Whatever is left in ``old`` was removed, unless its content reappears elsewhere
+    removed_by_digest = defaultdict(deque)
+    for path in sorted(old):
+        removed_by_digest[old[path]].append(path)
+    for path, digest in added:
+        candidates = removed_by_digest.get(digest)
+        if digest and candidates:
+            counts["MOVED"] += 1
+            yield {"status": "MOVED", "from": candidates.popleft(), "to": path, "digest": digest}
+        else:
+            counts["ADDED"] += 1
+            yield {"status": "ADDED", "path": path, "digest": digest}
+    for path in sorted(p for paths in removed_by_digest.values() for p in paths):
+        counts["REMOVED"] += 1
+        yield {"status": "REMOVED", "path": path, "digest": old[path]}
+
+    yield {"summary": dict(counts, key=key_algo)}
@@ -0,0 +1,241 @@
+"""
+baseline_format.py
+Streaming baseline formats for very large trees, picked by file extension:
+
+  .json            legacy list of entries, or the web app's {user: [entries]} dict (loaded whole)
+  .ndjson / .jsonl one JSON entry per line, written and read incrementally
+  .fib             compact binary: raw digest bytes and paths relative to a root
+  .db / .sqlite    SQLite store (see baseline_store.py)
+
+Binary layout: b"FIB1", a little-endian u32 header length and a JSON header
+{"root": ..., "algos": [...]}; then one record per entry, each a u32 payload
+length followed by:
+  u16 path length, path bytes (utf-8, relative to root when under it)
+  u8 flags (1 = digests present, 2 = stat present)
+  raw digests in header algo order
+  size u64, mtime_ns i64, ctime_ns i64, inode u64   (if stat present)
+  remaining bytes: JSON object with any other fields (may be empty)
+"""
+
+import json
+import os
+import struct
+
+from baseline_store import BaselineStore, is_sqlite_path
+from hash_engine import DEFAULT_ALGOS, new_hasher
+
+MAGIC = b"FIB1"
+NDJSON_EXTS = (".ndjson", ".jsonl")
+BINARY_EXTS = (".fib",)
+
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_STAT = struct.Struct("<QqqQ")
+_STAT_KEYS = ("size", "mtime_ns", "ctime_ns", "inode")
+_HAS_DIGESTS = 1
+_HAS_STAT = 2
+
+def baseline_kind(path):
+    lower = str(path).lower()
+    if is_sqlite_path(lower):
+        return "sqlite"
+    if lower.endswith(NDJSON_EXTS):
+        return "ndjson"
+    if lower.endswith(BINARY_EXTS):
+        return "binary"
+    return "json"
+
+def _encode_path(path):
+    return path.encode("utf-8", "surrogateescape")
+
+def _decode_path(raw):
+    return raw.decode("utf-8", "surrogateescape")
+
+class _FileWriter:
+    # Writes to "<path>.tmp" and renames on a clean close, so an interrupted
+    # run never leaves a truncated baseline in place of the old one.
+    def __init__(self, path, mode):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.f = open(self.tmp_path, mode)
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+        return False
+
+    def close(self, commit=True):
+        if self.f is None:
+            return
+        self.f.close()
+        self.f = None
+        if commit:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+
+class NdjsonWriter(_FileWriter):
+    def __init__(self, path):
+        super().__init__(path, "w")
+
+    def write(self, entry):
+        self.f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.count += 1
+
+class BinaryWriter(_FileWriter):
+    def __init__(self, path, root=None, algos=DEFAULT_ALGOS):
+        super().__init__(path, "wb")
+        self.root = os.path.abspath(root) if root else ""
+        self.algos = list(algos)
+        header = json.dumps({"root": self.root, "algos": self.algos}).encode("utf-8")
+        self.f.write(MAGIC + _U32.pack(len(header)) + header)
+
+    def write(self, entry):
+        path = entry["path"]
+        if self.root and path.startswith(self.root + os.sep):
+            path = path[len(self.root) + 1:]
+        raw_path = _encode_path(path)
+        flags = 0
+        known = {"path"}
+        body = []
+        if all(entry.get(a) for a in self.algos):
+            flags |= _HAS_DIGESTS
+            known.update(self.algos)
+            body.extend(bytes.fromhex(entry[a]) for a in self.algos)
+        if all(k in entry for k in _STAT_KEYS):
+            flags |= _HAS_STAT
+            known.update(_STAT_KEYS)
+            body.append(_STAT.pack(*(entry[k] for k in _STAT_KEYS)))
+        extra = {k: v for k, v in entry.items() if k not in known}
+        if extra:
+            body.append(json.dumps(extra, separators=(",", ":")).encode("utf-8"))
+        payload = b"".join([_U16.pack(len(raw_path)), raw_path, bytes([flags]), *body])
+        self.f.write(_U32.pack(len(payload)) + payload)
+        self.count += 1
+
+class JsonWriter(_FileWriter):
+    # The legacy format is a single JSON list, so entries are collected first.
+    def __init__(self, path):
+        super().__init__(path, "w")
+        self.entries = []
+
+    def write(self, entry):
+        self.entries.append(entry)
+        self.count += 1
+
+    def close(self, commit=True):
+        if self.f is not None and commit:
+            json.dump(self.entries, self.f, indent=2)
+        super().close(commit)
+
+class SqliteWriter:
+    # Rows are staged in a TEMP table and swapped in on a clean close, so the
+    # CLI user's baseline is replaced (deleted files drop out) all at once and
+    # an interrupted run leaves the previous one untouched.
+    def __init__(self, path, batch_size=1000):
+        self.store = BaselineStore(path)
+        self.store.drop_staged()
+        self.batch_size = batch_size
+        self.batch = []
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+        return False
+
+    def write(self, entry):
+        self.batch.append(entry)
+        self.count += 1
+        if len(self.batch) >= self.batch_size:
+            self.store.stage(self.batch)
+            self.batch = []
+
+    def close(self, commit=True):
+        if self.store is None:
+            return
+        if commit:
+            self.store.stage(self.batch)
+            self.store.commit_staged()
+        else:
+            self.store.drop_staged()
+        self.batch = []
+        self.store.close()
+        self.store = None
+
+def open_writer(path, root=None, algos=DEFAULT_ALGOS):
+    kind = baseline_kind(path)
+    if kind == "sqlite":
+        return SqliteWriter(path)
+    if kind == "ndjson":
+        return NdjsonWriter(path)
+    if kind == "binary":
+        return BinaryWriter(path, root, algos)
+    return JsonWriter(path)
+
+def iter_baseline(path):
+    """Yield entries from any baseline format; only legacy JSON is loaded whole."""
+    if not os.path.exists(path):
+        return
+    kind = baseline_kind(path)
+    if kind == "sqlite":
+        yield from BaselineStore(path).entries()
+    elif kind == "ndjson":
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif kind == "binary":
+        yield from _iter_binary(path)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            # Web baseline: {username: [entries]}, flattened as BaselineStore.import_json reads it
+            for entries in data.values():
+                yield from entries
+        else:
+            yield from data
+
+def _read_exact(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError("truncated binary baseline")
+    return data
+
+def _iter_binary(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a binary baseline")
+        (header_len,) = _U32.unpack(_read_exact(f, _U32.size))
+        header = json.loads(_read_exact(f, header_len))
+        root, algos = header["root"], header["algos"]
+        sizes = [new_hasher(a).digest_size for a in algos]
+        while True:
+            raw_len = f.read(_U32.size)
+            if not raw_len:
+                break
+            (payload_len,) = _U32.unpack(raw_len)
+            payload = memoryview(_read_exact(f, payload_len))
+            (path_len,) = _U16.unpack_from(payload, 0)
+            pos = _U16.size
+            rel = _decode_path(bytes(payload[pos:pos + path_len]))
+            pos += path_len
+            flags = payload[pos]
+            pos += 1
+            entry = {"path": os.path.join(root, rel) if root else rel}
+            if flags & _HAS_DIGESTS:
+                for algo, size in zip(algos, sizes):
+                    entry[algo] = payload[pos:pos + size].hex()
+                    pos += size
+            if flags & _HAS_STAT:
+                entry.update(zip(_STAT_KEYS, _STAT.unpack_from(payload, pos)))
+                pos += _STAT.size
+            if pos < payload_len:
+                entry.update(json.loads(bytes(payload[pos:])))
+            yield entry
@@ -0,0 +1,297 @@
+"""
+baseline_store.py
+SQLite-backed baseline storage shared by cli_checker.py and web_checker.py.
+
+Entries are the same dicts the JSON baselines hold ({"path", "md5", "sha1",
+"sha256", ...}); known fields get their own columns and anything else is kept
+in a JSON ``extra`` column. CLI entries are stored under the empty username.
+"""
+
+import json
+import sqlite3
+import threading
+
+DB_FILE = "app.db"
+CLI_USER = ""
+COLUMNS = ["path", "md5", "sha1", "sha256", "size", "mtime_ns", "ctime_ns", "inode", "timestamp"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS baselines (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL DEFAULT '',
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    md5 TEXT,
+    sha1 TEXT,
+    sha256 TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    ctime_ns INTEGER,
+    inode INTEGER,
+    timestamp TEXT,
+    extra TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_baselines_user_path ON baselines(username, path);
+CREATE INDEX IF NOT EXISTS idx_baselines_user_filename ON baselines(username, filename);
+CREATE INDEX IF NOT EXISTS idx_baselines_path ON baselines(path);
+CREATE INDEX IF NOT EXISTS idx_baselines_user_timestamp ON baselines(username, timestamp);
+CREATE TABLE IF NOT EXISTS baseline_versions (
+    username TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER,
+    refcount INTEGER NOT NULL
+);
+"""
+# Columns the dashboard may sort on; each is covered by a (username, col) index
+SORT_COLUMNS = {"filename": "filename", "timestamp": "timestamp"}
+
+def is_sqlite_path(path):
+    return str(path).lower().endswith((".db", ".sqlite", ".sqlite3"))
+
+def entry_filename(path):
+    # Web entries may carry Windows paths, so split on both separators.
+    return path.replace("\\", "/").rsplit("/", 1)[-1]
+
+class BaselineStore:
+    """Indexed baseline table with one connection per thread, in WAL mode."""
+
+    def __init__(self, db_path=DB_FILE):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def transaction(self):
+        return _Transaction(self._conn())
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- writes ---
+    def upsert(self, entries, username=CLI_USER):
+        """Insert or replace entries keyed by (username, path) in one transaction."""
+        sql = "INSERT INTO baselines (%s) VALUES (%s) %s" % (
+            _INSERT_COLUMNS, ", ".join("?" for _ in _INSERT_COLUMNS.split(", ")), _ON_CONFLICT,
+        )
+        count = 0
+        with self.transaction() as conn:
+            for entry in entries:
+                conn.execute(sql, _entry_params(entry, username))
+                count += 1
+            _bump_version(conn, username)
+        return count
+
+    # --- staged replace (CLI generate) ---
+    def stage(self, entries, username=CLI_USER):
+        """Collect entries in this connection's TEMP staging table; no write lock is taken."""
+        conn = self._conn()
+        _create_staging(conn)
+        conn.executemany(
+            "INSERT OR REPLACE INTO temp.staged (%s) VALUES (%s)"
+            % (_INSERT_COLUMNS, ", ".join("?" for _ in _INSERT_COLUMNS.split(", "))),
+            [_entry_params(entry, username) for entry in entries],
+        )
+
+    def commit_staged(self, username=CLI_USER):
+        """Make the staged entries ``username``'s whole baseline in one short transaction.
+
+        Rows not staged are deleted; rows already present keep their id, so
+        insertion order is stable across regenerations.
+        """
+        with self.transaction() as conn:
+            _create_staging(conn)
+            conn.execute(
+                "DELETE FROM baselines WHERE username = ? AND path NOT IN (SELECT path FROM temp.staged)",
+                (username,),
+            )
+            # "WHERE true" keeps SQLite from reading ON CONFLICT as a join constraint
+            conn.execute(
+                "INSERT INTO baselines (%s) SELECT %s FROM temp.staged WHERE true ORDER BY rowid %s"
+                % (_INSERT_COLUMNS, _INSERT_COLUMNS, _ON_CONFLICT)
+            )
+            _bump_version(conn, username)
+        self.drop_staged()
+
+    def drop_staged(self):
+        self._conn().execute("DROP TABLE IF EXISTS temp.staged")
+
+    def record_upload(self, username, entry, store, remove):
+        """Store a content-addressed upload (web "generate") with blob reference counts.
+
+        The user's entries with the same basename are replaced by ``entry``.
+
+        ``entry["blob"]`` is the sha256 of the uploaded content. Inside the write
+        transaction ``store(known)`` must make sure the object exists (``known``
+        means the blobs table already references it) and ``remove(sha256)``
+        deletes an object whose last entry went away. Doing both under the lock
+        means a concurrent upload of the same content never sees a blob that is
+        half collected.
+        """
+        sha256 = entry["blob"]
+        filename = entry_filename(entry["path"])
+        with self.transaction() as conn:
+            replaced = [
+                json.loads(row[0]).get("blob")
+                for row in conn.execute(
+                    "SELECT extra FROM baselines WHERE username = ? AND filename = ? AND extra IS NOT NULL",
+                    (username, filename),
+                )
+            ]
+            known = conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone() is not None
+            store(known)
+            conn.execute(
+                "INSERT INTO blobs (sha256, size, refcount) VALUES (?, ?, 1) "
+                "ON CONFLICT(sha256) DO UPDATE SET refcount = refcount + 1",
+                (sha256, entry.get("size")),
+            )
+            conn.execute("DELETE FROM baselines WHERE username = ? AND filename = ?", (username, filename))
+            conn.execute(
+                "INSERT INTO baselines (username, filename, %s, extra) VALUES (?, ?, %s, ?)"
+                % (", ".join(COLUMNS), ", ".join("?" for _ in COLUMNS)),
+                _entry_params(entry, username),
+            )
+            for blob in filter(None, replaced):
+                conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", (blob,))
+                row = conn.execute("SELECT refcount FROM blobs WHERE sha256 = ?", (blob,)).fetchone()
+                if row is not None and row[0] <= 0:
+                    conn.execute("DELETE FROM blobs WHERE sha256 = ?", (blob,))
+                    remove(blob)
+            _bump_version(conn, username)
+        return known
+
+    # --- reads ---
+    def get_by_path(self, path, username=CLI_USER):
+        row = self._conn().execute(
+            "SELECT * FROM baselines WHERE username = ? AND path = ?", (username, path)
+        ).fetchone()
+        return _row_to_entry(row) if row else None
+
+    def get_by_filename(self, filename, username=CLI_USER):
+        row = self._conn().execute(
+            "SELECT * FROM baselines WHERE username = ? AND filename = ? ORDER BY id DESC LIMIT 1",
+            (username, filename),
+        ).fetchone()
+        return _row_to_entry(row) if row else None
+
+    def entries(self, username=CLI_USER):
+        """Iterate a user's entries in insertion order without loading them all."""
+        cur = self._conn().execute("SELECT * FROM baselines WHERE username = ? ORDER BY id", (username,))
+        for row in cur:
+            yield _row_to_entry(row)
+
+    def version(self, username=CLI_USER):
+        """Counter bumped on every write for ``username``; cheap cache/ETag key."""
+        row = self._conn().execute(
+            "SELECT version FROM baseline_versions WHERE username = ?", (username,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def page(self, username, search="", sort="timestamp", descending=True, limit=50, offset=0):
+        """One page of a user's entries plus the total matching count.
+
+        ``search`` is a case-insensitive substring of the filename.
+        """
+        column = SORT_COLUMNS.get(sort, "timestamp")
+        where = "username = ?"
+        params = [username]
+        if search:
+            where += " AND filename LIKE ? ESCAPE '\\'"
+            params.append("%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM baselines WHERE {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM baselines WHERE {where} ORDER BY {column} {'DESC' if descending else 'ASC'}, id "
+            "LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        ).fetchall()
+        return [_row_to_entry(row) for row in rows], total
+
+    def usernames(self):
+        return [r[0] for r in self._conn().execute("SELECT DISTINCT username FROM baselines ORDER BY username")]
+
+    def count(self, username=None):
+        if username is None:
+            return self._conn().execute("SELECT COUNT(*) FROM baselines").fetchone()[0]
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM baselines WHERE username = ?", (username,)
+        ).fetchone()[0]
+
+    # --- JSON import / export ---
+    def import_json(self, json_path, username=CLI_USER):
+        """Import a CLI list baseline (into ``username``) or a web per-user dict baseline."""
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            return sum(self.upsert(entries, user) for user, entries in data.items())
+        return self.upsert(data, username)
+
+    def export_json(self, json_path, username=None):
+        """Write a CLI list baseline for ``username``, or the web per-user dict when None."""
+        if username is None:
+            data = {user: list(self.entries(user)) for user in self.usernames() if user != CLI_USER}
+        else:
+            data = list(self.entries(username))
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        return data
+
+class _Transaction:
+    # BEGIN IMMEDIATE takes the write lock up front, so two gunicorn workers
+    # generating at once serialise instead of overwriting each other.
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+_INSERT_COLUMNS = "username, filename, %s, extra" % ", ".join(COLUMNS)
+_ON_CONFLICT = "ON CONFLICT(username, path) DO UPDATE SET filename=excluded.filename, %s, extra=excluded.extra" % (
+    ", ".join(f"{c}=excluded.{c}" for c in COLUMNS if c != "path")
+)
+
+def _create_staging(conn):
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS staged AS SELECT * FROM main.baselines WHERE 0")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS temp.idx_staged_path ON staged(path)")
+
+def _bump_version(conn, username):
+    conn.execute(
+        "INSERT INTO baseline_versions (username, version) VALUES (?, 1) "
+        "ON CONFLICT(username) DO UPDATE SET version = version + 1",
+        (username,),
+    )
+
+def _entry_params(entry, username):
+    path = entry["path"]
+    extra = {k: v for k, v in entry.items() if k not in COLUMNS}
+    return (
+        username,
+        entry_filename(path),
+        *(entry.get(c) for c in COLUMNS),
+        json.dumps(extra) if extra else None,
+    )
+
+def _row_to_entry(row):
+    entry = {c: row[c] for c in COLUMNS if row[c] is not None}
+    if row["extra"]:
+        entry.update(json.loads(row["extra"]))
+    return entry
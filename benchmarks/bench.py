@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+benchmarks/bench.py
+Throughput benchmarks for baseline generation and verification.
+
+Builds synthetic trees (many tiny files, a few huge files, deep nesting and a
+mix) in a temp directory, then measures files/s, MB/s and peak RSS for:
+  - generate:      cli_checker.generate_baseline_for_folder
+  - verify:        cli_checker --verify-all against an NDJSON baseline that a
+                   separate process generated and saved beforehand
+  - web_generate:  POST / with action=generate through the Flask test client
+  - web_verify:    POST / with action=verify through the Flask test client
+
+Every measurement runs in a fresh spawned process so peak RSS is per phase.
+
+Usage examples:
+  - Run and save: python benchmarks/bench.py --out bench.json
+  - Smaller trees: python benchmarks/bench.py --scale 0.1 --out bench.json
+  - Compare to a stored run: python benchmarks/bench.py --out new.json --compare bench.json
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+MIB = 1024 * 1024
+PHASES = ["generate", "verify", "web_generate", "web_verify"]
+WEB_FILE_LIMIT = 500
+
+def _write(path, size):
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining:
+            n = min(remaining, 4 * MIB)
+            f.write(os.urandom(n))
+            remaining -= n
+
+def build_tiny(root, scale):
+    for i in range(max(1, int(5000 * scale))):
+        d = os.path.join(root, f"d{i // 500}")
+        os.makedirs(d, exist_ok=True)
+        _write(os.path.join(d, f"f{i}.bin"), 1024)
+
+def build_huge(root, scale):
+    os.makedirs(root, exist_ok=True)
+    for i in range(3):
+        _write(os.path.join(root, f"big{i}.bin"), max(MIB, int(64 * MIB * scale)))
+
+def build_deep(root, scale):
+    for branch in range(max(1, int(10 * scale))):
+        d = os.path.join(root, f"b{branch}")
+        for level in range(25):
+            d = os.path.join(d, f"l{level}")
+            os.makedirs(d, exist_ok=True)
+            for i in range(4):
+                _write(os.path.join(d, f"f{i}.bin"), 4096)
+
+def build_mixed(root, scale):
+    build_tiny(os.path.join(root, "tiny"), scale / 5)
+    build_deep(os.path.join(root, "deep"), scale / 5)
+    os.makedirs(os.path.join(root, "medium"), exist_ok=True)
+    for i in range(max(1, int(50 * scale))):
+        _write(os.path.join(root, "medium", f"m{i}.bin"), 256 * 1024)
+    _write(os.path.join(root, "large.bin"), max(MIB, int(32 * MIB * scale)))
+
+WORKLOADS = {
+    "tiny": build_tiny,
+    "huge": build_huge,
+    "deep": build_deep,
+    "mixed": build_mixed,
+}
+
+def _peak_rss_kb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def _stats(files, nbytes, seconds):
+    seconds = max(seconds, 1e-9)
+    return {
+        "files": files,
+        "bytes": nbytes,
+        "seconds": round(seconds, 4),
+        "files_per_s": round(files / seconds, 2),
+        "mb_per_s": round(nbytes / MIB / seconds, 2),
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+@contextlib.contextmanager
+def _argv(argv):
+    saved = sys.argv
+    sys.argv = argv
+    try:
+        yield
+    finally:
+        sys.argv = saved
+
+def _tree_files(root):
+    out = []
+    for dirpath, _dirs, files in os.walk(root):
+        out.extend(os.path.join(dirpath, f) for f in files)
+    return sorted(out)
+
+def _build_baseline(tree, baseline, jobs):
+    # Runs in its own spawned process, so the verify phase's peak RSS is its own.
+    import cli_checker
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        cli_checker.save_baseline(cli_checker.iter_generate_folder(tree, jobs=jobs), baseline)
+
+def _run_phase(phase, tree, workdir, jobs):
+    # Runs inside a spawned child process.
+    import cli_checker
+
+    if phase == "generate":
+        start = time.perf_counter()
+        entries = cli_checker.generate_baseline_for_folder(tree, jobs=jobs)
+        elapsed = time.perf_counter() - start
+        return _stats(len(entries), sum(os.path.getsize(e["path"]) for e in entries), elapsed)
+    if phase == "verify":
+        # The real --verify-all: baseline read back from disk, default policy, worker pool
+        import io
+        from baseline_format import iter_baseline
+
+        baseline = os.path.join(workdir, "baseline.ndjson")
+        out = io.StringIO()
+        argv = ["cli_checker.py", "--verify-all", "--baseline", baseline, "--jobs", str(jobs)]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(out), _argv(argv):
+            cli_checker.main()
+        elapsed = time.perf_counter() - start
+        lines = out.getvalue().splitlines()
+        bad = [line for line in lines if not line.startswith("ORIGINAL - ")]
+        assert not bad, bad[:5]
+        nbytes = sum(os.path.getsize(e["path"]) for e in iter_baseline(baseline))
+        return _stats(len(lines), nbytes, elapsed)
+
+    # web_checker uses relative data paths, so give it a scratch cwd
+    os.chdir(workdir)
+    import io
+    import web_checker
+
+    web_checker.app.config["TESTING"] = True
+    client = web_checker.app.test_client()
+    client.post("/register", data={"username": "bench", "password": "bench"})
+    client.post("/login", data={"username": "bench", "password": "bench"})
+    files = _tree_files(tree)[:WEB_FILE_LIMIT]
+    payloads = []
+    for path in files:
+        with open(path, "rb") as f:
+            payloads.append((os.path.relpath(path, tree).replace(os.sep, "_"), f.read()))
+
+    def post(action, name, data):
+        resp = client.post(
+            "/?action=" + action,
+            data={"action": action, "file": (io.BytesIO(data), name)},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 200, resp.status_code
+
+    if phase == "web_verify":
+        for name, data in payloads:
+            post("generate", name, data)
+    start = time.perf_counter()
+    for name, data in payloads:
+        post("generate" if phase == "web_generate" else "verify", name, data)
+    elapsed = time.perf_counter() - start
+    return _stats(len(payloads), sum(len(d) for _, d in payloads), elapsed)
+
+def run(scale, jobs, workloads, phases):
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    base = tempfile.mkdtemp(prefix="fic-bench-")
+    try:
+        for name in workloads:
+            tree = os.path.join(base, name)
+            WORKLOADS[name](tree, scale)
+            results[name] = {}
+            for phase in phases:
+                workdir = tempfile.mkdtemp(dir=base, prefix=f"{name}-{phase}-")
+                if phase == "verify":
+                    with ctx.Pool(1) as pool:
+                        pool.apply(_build_baseline, (tree, os.path.join(workdir, "baseline.ndjson"), jobs))
+                with ctx.Pool(1) as pool:
+                    stats = pool.apply(_run_phase, (phase, tree, workdir, jobs))
+                results[name][phase] = stats
+                print(f"{name:6} {phase:13} {stats['files']:7d} files  {stats['files_per_s']:10.1f} files/s  "
+                      f"{stats['mb_per_s']:9.1f} MB/s  {stats['peak_rss_kb'] // 1024:6d} MiB peak", flush=True)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "scale": scale,
+            "jobs": jobs,
+        },
+        "results": results,
+    }
+
+def compare(old, new, threshold):
+    """Return a list of regression messages (throughput down or peak RSS up by > threshold)."""
+    regressions = []
+    for name, phases in new["results"].items():
+        for phase, stats in phases.items():
+            before = old.get("results", {}).get(name, {}).get(phase)
+            if not before:
+                continue
+            for key in ("files_per_s", "mb_per_s"):
+                if before[key] and stats[key] < before[key] * (1 - threshold):
+                    regressions.append(f"{name}/{phase} {key}: {before[key]} -> {stats[key]}")
+            if before["peak_rss_kb"] and stats["peak_rss_kb"] > before["peak_rss_kb"] * (1 + threshold):
+                regressions.append(f"{name}/{phase} peak_rss_kb: {before['peak_rss_kb']} -> {stats['peak_rss_kb']}")
+    return regressions
+
+def main():
+    p = argparse.ArgumentParser(description="File Integrity Checker benchmarks")
+    p.add_argument("--scale", type=float, default=1.0, help="Multiply workload sizes by this factor (default 1.0)")
+    p.add_argument("--jobs", type=int, default=os.cpu_count() or 1, metavar="N", help="Hashing workers for the CLI phases")
+    p.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    p.add_argument("--phases", nargs="+", choices=PHASES, default=PHASES)
+    p.add_argument("--out", help="Write results as JSON to this file", metavar="JSON")
+    p.add_argument("--compare", help="Flag regressions against a stored results file", metavar="JSON")
+    p.add_argument("--threshold", type=float, default=0.10,
+                   help="Relative change that counts as a regression (default 0.10)")
+    args = p.parse_args()
+
+    report = run(args.scale, args.jobs, args.workloads, args.phases)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        regressions = compare(old, report, args.threshold)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+        print("No regressions.")
+
+if __name__ == "__main__":
+    main()
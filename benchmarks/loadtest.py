@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+benchmarks/loadtest.py
+Requests/s for the web app's hot request paths.
+
+Drives web_checker through Flask's test client (no server or network, so the
+numbers are the app's own CPU cost per request) in a scratch directory with a
+fresh users.json and app.db. Each scenario is run for a fixed number of
+requests from ``--threads`` client threads:
+  - login_page:   GET /login
+  - login:        POST /login (password check included)
+  - index:        GET /
+  - dashboard:    GET /dashboard with --baselines entries in the user's baseline
+  - dashboard_304 GET /dashboard revalidated with If-None-Match
+  - verify:       POST /?action=verify with a small upload
+
+Usage examples:
+  - Run and save: python benchmarks/loadtest.py --out load.json
+  - Compare to a stored run: python benchmarks/loadtest.py --compare load.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+SCENARIOS = ["login_page", "login", "index", "dashboard", "dashboard_304", "verify"]
+PASSWORD = "load-test"
+
+def _client(app, username):
+    client = app.test_client()
+    client.post("/login", data={"username": username, "password": PASSWORD})
+    return client
+
+def _request_for(scenario, client, etag):
+    if scenario == "login_page":
+        return lambda: client.get("/login")
+    if scenario == "login":
+        return lambda: client.post("/login", data={"username": "load0", "password": PASSWORD})
+    if scenario == "index":
+        return lambda: client.get("/")
+    if scenario == "dashboard":
+        return lambda: client.get("/dashboard")
+    if scenario == "dashboard_304":
+        return lambda: client.get("/dashboard", headers={"If-None-Match": etag})
+    if scenario == "verify":
+        return lambda: client.post(
+            "/?action=verify",
+            data={"action": "verify", "file": (io.BytesIO(b"x" * 4096), "file0.txt")},
+            content_type="multipart/form-data",
+        )
+    raise ValueError(scenario)
+
+def run(requests, threads, baselines, users, scenarios):
+    workdir = tempfile.mkdtemp(prefix="fic-load-")
+    cwd = os.getcwd()
+    # web_checker keeps its data files relative to the working directory
+    os.chdir(workdir)
+    try:
+        import web_checker
+
+        app = web_checker.app
+        app.config["TESTING"] = True
+        # One password hash for everyone: registering each user would mostly time the KDF
+        from werkzeug.security import generate_password_hash
+        password_hash = generate_password_hash(PASSWORD)
+        web_checker.save_users({f"load{i}": password_hash for i in range(users)})
+        web_checker.baseline_store.upsert([
+            {"path": os.path.join(workdir, "uploads", f"file{i}.txt"), "sha256": f"{i:064x}",
+             "timestamp": "2024-01-01T00:00:00"}
+            for i in range(baselines)
+        ], "load0")
+        etag = _client(app, "load0").get("/dashboard").headers.get("ETag", "").strip('"')
+
+        results = {}
+        for scenario in scenarios:
+            per_thread = max(1, requests // threads)
+            if scenario in ("login_page", "login"):
+                # Logged-in sessions are redirected away from /login, so these go without cookies
+                clients = [app.test_client(use_cookies=False) for _ in range(threads)]
+            else:
+                clients = [_client(app, "load0") for _ in range(threads)]
+            calls = [_request_for(scenario, c, etag) for c in clients]
+            calls[0]()  # warm-up
+            errors = []
+            start_gate = threading.Barrier(threads + 1)
+
+            def worker(call):
+                start_gate.wait()
+                for _ in range(per_thread):
+                    status = call().status_code
+                    if status >= 400:
+                        errors.append(status)
+
+            pool = [threading.Thread(target=worker, args=(call,)) for call in calls]
+            for t in pool:
+                t.start()
+            start_gate.wait()
+            start = time.perf_counter()
+            for t in pool:
+                t.join()
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            total = per_thread * threads
+            results[scenario] = {
+                "requests": total,
+                "seconds": round(elapsed, 4),
+                "requests_per_s": round(total / elapsed, 1),
+                "mean_ms": round(elapsed / per_thread * 1000, 3),
+                "errors": len(errors),
+            }
+            print(f"{scenario:14} {total:6d} req  {results[scenario]['requests_per_s']:9.1f} req/s  "
+                  f"{results[scenario]['mean_ms']:8.3f} ms/req  {len(errors)} errors", flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": requests,
+            "threads": threads,
+            "baselines": baselines,
+            "users": users,
+        },
+        "results": results,
+    }
+
+def compare(old, new):
+    """Print the requests/s change per scenario against a stored run."""
+    for scenario, stats in new["results"].items():
+        before = old.get("results", {}).get(scenario)
+        if not before or not before["requests_per_s"]:
+            continue
+        change = stats["requests_per_s"] / before["requests_per_s"]
+        print(f"{scenario:14} {before['requests_per_s']:9.1f} -> {stats['requests_per_s']:9.1f} req/s  "
+              f"(x{change:.2f})")
+
+def main():
+    p = argparse.ArgumentParser(description="File Integrity Checker web load test")
+    p.add_argument("--requests", type=int, default=2000, help="Requests per scenario (default 2000)")
+    p.add_argument("--threads", type=int, default=4, help="Concurrent client threads (default 4)")
+    p.add_argument("--baselines", type=int, default=500, help="Baseline entries for the dashboard user")
+    p.add_argument("--users", type=int, default=200, help="Registered users in users.json")
+    p.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    p.add_argument("--out", help="Write results as JSON to this file", metavar="JSON")
+    p.add_argument("--compare", help="Show requests/s change against a stored results file", metavar="JSON")
+    args = p.parse_args()
+
+    report = run(args.requests, args.threads, args.baselines, args.users, args.scenarios)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
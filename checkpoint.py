@@ -0,0 +1,108 @@
+"""
+checkpoint.py
+Crash-safe progress journal for long --generate-folder runs.
+
+Finished entries are appended to "<baseline>.ckpt" (NDJSON, after a header
+line holding the options the run was started with) and the file is flushed
+and fsync'd every CHECKPOINT_EVERY entries or CHECKPOINT_SECONDS, so a crash,
+OOM kill or Ctrl-C loses at most that much work. Generation walks in a stable
+order, so the last journal line is also the walk position. The journal is
+removed once the baseline has been written completely.
+"""
+
+import json
+import os
+import time
+
+CHECKPOINT_SUFFIX = ".ckpt"
+CHECKPOINT_EVERY = 1000
+CHECKPOINT_SECONDS = 30.0
+
+class Checkpoint:
+    def __init__(self, path, options):
+        self.path = path
+        self.options = options
+        self.f = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def open(self, resume=False):
+        """Start journaling and return {path: entry} of work already done.
+
+        With ``resume`` the existing journal is loaded (if it was written with
+        the same options) and appended to; otherwise it is started afresh.
+        """
+        done = self._load() if resume else {}
+        if done:
+            # Cut off a torn last line first, or the next record would be glued onto it
+            os.truncate(self.path, self._good_end)
+            self.f = open(self.path, "a", encoding="utf-8")
+        else:
+            self.f = open(self.path, "w", encoding="utf-8")
+            self._write({"checkpoint": 1, **self.options})
+            self.sync()
+        return done
+
+    def _load(self):
+        # Also sets self._good_end: the byte offset just past the last complete record
+        self._good_end = 0
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return {}
+        done = {}
+        with f:
+            line = f.readline()
+            try:
+                header = json.loads(line)
+            except ValueError:
+                return {}
+            if {k: header.get(k) for k in self.options} != self.options:
+                print(f"Checkpoint {self.path} was made with different options; starting over.")
+                return {}
+            offset = len(line)
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated line")
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn last line from the interrupted run
+                done[entry["path"]] = entry
+                offset += len(line)
+            self._good_end = offset
+        return done
+
+    def _write(self, record):
+        self.f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def record(self, entry):
+        self._write(entry)
+        self._unsynced += 1
+        if self._unsynced >= CHECKPOINT_EVERY or time.monotonic() - self._last_sync >= CHECKPOINT_SECONDS:
+            self.sync()
+
+    def sync(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def track(self, entries, done=None):
+        """Pass ``entries`` through, journaling each one that is not reused from ``done``."""
+        done = done or {}
+        for entry in entries:
+            if done.get(entry["path"]) is not entry:
+                self.record(entry)
+            yield entry
+
+    def close(self, finished=False):
+        if self.f is None:
+            return
+        if finished:
+            self.f.close()
+            os.remove(self.path)
+        else:
+            self.sync()
+            self.f.close()
+        self.f = None
@@ -6,113 +6,676 @@ Usage examples:
   - Generate baseline for folder: python cli_checker.py --generate-folder path/to/folder
   - Verify a file: python cli_checker.py --verify path/to/file
   - Verify all from baseline: python cli_checker.py --verify-all
+  - Use 8 hashing workers: python cli_checker.py --verify-all --jobs 8
+  - Only rehash files whose stat changed: python cli_checker.py --verify-all --fast
+  - Use the SQLite store: python cli_checker.py --generate-folder path/to/folder --baseline app.db
+  - Add per-chunk Merkle trees for big files: python cli_checker.py --generate-folder path/to/folder --merkle
+  - Stream a compact binary baseline: python cli_checker.py --generate-folder path/to/folder --baseline tree.fib
+  - Watch baselined files and alert on change (Linux): python cli_checker.py --watch
+  - Record BLAKE2b plus a crc32 pre-check: python cli_checker.py --generate-folder path/to/folder --algos blake2b,crc32
+  - Print a throughput profile: python cli_checker.py --verify-all --profile
+  - Resume an interrupted folder run: python cli_checker.py --generate-folder path/to/folder --resume
+  - Scan gently next to a live workload: python cli_checker.py --verify-all --ionice idle --max-bandwidth 50M --drop-cache
+  - Rehash a rotating 10% each night, all files within 10 runs: python cli_checker.py --verify-all --sample-fraction 0.1
+  - Baseline the members of release bundles: python cli_checker.py --generate-folder releases --archives
+  - Verify one of 4 shards: python cli_checker.py --verify-all --shard 2/4 --results shard2.ndjson
+  - Merge shard results: python cli_checker.py --merge-results shard*.ndjson
+  - Run 4 shards locally and merge: python cli_checker.py --verify-all --local-shards 4
+  - Diff two baselines (NDJSON to stdout): python cli_checker.py --diff old.json new.json
+  - Import a JSON baseline into SQLite: python cli_checker.py --import-json baseline.json --baseline app.db
 """
 
-import hashlib
-import json
 import os
 import argparse
+import cProfile
+import itertools
+import json
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from archive import MEMBER_SEP, abs_member_path, generate_archive_entries, is_archive, verify_archive
+from baseline_diff import diff_baselines
+from checkpoint import CHECKPOINT_SUFFIX, Checkpoint
+from baseline_format import iter_baseline, open_writer
+import metrics
+from baseline_store import BaselineStore, CLI_USER, DB_FILE, is_sqlite_path
+import io_sched
+from hash_engine import SUPPORTED_ALGOS, VERIFY_POLICIES, entry_algos, hash_file, plan_verify
+from merkle import CHUNK_SIZE, changed_ranges, check_chunks, hash_file_with_tree
+from sampling import COVERAGE_SUFFIX, Coverage, bucket_of, triage_chunks
+from shard import ResultWriter, merge_results, parse_shard, run_local, shard_of
+from watcher import DEBOUNCE_SECONDS, Watcher
 
 BASELINE_FILE = "baseline.json"
 HASH_ALGOS = ["md5", "sha1", "sha256"]
+STAT_FIELDS = ["size", "mtime_ns", "ctime_ns", "inode"]
+
+def calc_hash(path, algo="sha256"):
+    return hash_file(path, [algo])[algo]
 
-def calc_hash(path, algo="sha256", block_size=65536):
-    h = hashlib.new(algo)
-    with open(path, "rb") as f:
-        for block in iter(lambda: f.read(block_size), b""):
-            h.update(block)
-    return h.hexdigest()
+def stat_signature(st):
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "ctime_ns": st.st_ctime_ns, "inode": st.st_ino}
 
-def generate_baseline_for_file(path):
+def generate_baseline_for_file(path, threaded=False, merkle_chunk=None, algos=None, merkle_only=False):
+    """Hash one file; with ``merkle_chunk``, files bigger than one chunk also get a Merkle tree.
+
+    With ``merkle_only`` those files get only the tree, no whole-file digests.
+    """
+    algos = algos or HASH_ALGOS
     path = os.path.abspath(path)
     if not os.path.isfile(path):
         raise FileNotFoundError(path)
+    # stat before hashing: a write that lands mid-hash then shows up as a
+    # changed stat tuple on the next --fast run instead of being missed.
+    st = os.stat(path)
     entry = {"path": path}
-    for algo in HASH_ALGOS:
-        entry[algo] = calc_hash(path, algo)
+    if merkle_chunk and st.st_size > merkle_chunk:
+        digests, tree = hash_file_with_tree(path, [] if merkle_only else algos, merkle_chunk, threaded)
+        entry.update(digests)
+        entry["merkle"] = tree
+    else:
+        entry.update(hash_file(path, algos, threaded=threaded))
+    entry.update(stat_signature(st))
     return entry
 
-def generate_baseline_for_folder(folder):
-    entries = []
-    for root, dirs, files in os.walk(folder):
-        for fname in files:
-            full = os.path.join(root, fname)
+def walk_files(folder, order="path"):
+    """Yield file paths under folder in a stable, sorted depth-first order.
+
+    With ``order="inode"`` each directory's files come in inode order instead
+    of by name, which roughly follows their on-disk layout.
+    """
+    stack = [folder]
+    while stack:
+        current = stack.pop()
+        try:
+            with metrics.timed("walk"), os.scandir(current) as it:
+                dir_entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f"Skip {current}: {e}")
+            continue
+        if order == "inode":
+            dir_entries.sort(key=_inode_or_zero)
+        subdirs = []
+        for de in dir_entries:
             try:
-                entries.append(generate_baseline_for_file(full))
-            except Exception as e:
-                print(f"Skip {full}: {e}")
-    return entries
-
-def save_baseline(entries, outfile=BASELINE_FILE):
-    # baseline is list of entries
-    with open(outfile, "w", encoding="utf-8") as f:
-        json.dump(entries, f, indent=2)
+                if de.is_dir(follow_symlinks=False):
+                    subdirs.append(de.path)
+                elif de.is_file():
+                    yield de.path
+            except OSError as e:
+                print(f"Skip {de.path}: {e}")
+        stack.extend(reversed(subdirs))
+
+def _inode_or_zero(de):
+    try:
+        return de.inode()
+    except OSError:
+        return 0
+
+def ordered_map(func, items, jobs=1):
+    """Like map(), but runs func on a thread pool of ``jobs`` workers.
+
+    Results come back in input order and at most ``jobs * 4`` items are in
+    flight at once, so memory stays bounded however long ``items`` is.
+    """
+    if jobs <= 1:
+        for item in items:
+            yield func(item)
+        return
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= jobs * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _try_generate(path, threaded=False, merkle_chunk=None, algos=None, archives=False, merkle_only=False):
+    # Returns (path, [entries], error): an archive expands to one entry per member
+    try:
+        if archives and is_archive(path):
+            return path, generate_archive_entries(path, algos or HASH_ALGOS, threaded), None
+        return path, [generate_baseline_for_file(path, threaded, merkle_chunk, algos, merkle_only)], None
+    except Exception as e:
+        return path, None, e
+
+def _reuse_or_generate(path, done, threaded=False, merkle_chunk=None, algos=None, archives=False,
+                       merkle_only=False):
+    # A checkpointed entry is reused while its stat tuple is unchanged
+    entry = done.get(path)
+    if entry is not None and all(f in entry for f in STAT_FIELDS):
+        try:
+            if stat_signature(os.stat(path)) == {f: entry[f] for f in STAT_FIELDS}:
+                return path, [entry], None
+        except OSError:
+            pass
+    return _try_generate(path, threaded, merkle_chunk, algos, archives, merkle_only)
+
+def iter_generate_folder(folder, threaded=False, jobs=1, merkle_chunk=None, algos=None, done=None, order="path",
+                         archives=False, merkle_only=False):
+    """Yield baseline entries for every file under folder as soon as each is hashed.
+
+    ``done`` maps absolute paths to entries from an earlier, interrupted run;
+    those are yielded as-is (the same objects) when the file's stat still matches.
+    With ``archives``, tar/zip files yield an entry per member instead (see archive.py).
+    """
+    if done:
+        work = lambda full: _reuse_or_generate(os.path.abspath(full), done, threaded, merkle_chunk, algos, archives,
+                                               merkle_only)
+    else:
+        work = lambda full: _try_generate(full, threaded, merkle_chunk, algos, archives, merkle_only)
+    for full, entries, err in ordered_map(work, walk_files(folder, order), jobs):
+        if err is not None:
+            print(f"Skip {full}: {err}")
+            continue
+        yield from entries
+
+def generate_baseline_for_folder(folder, threaded=False, jobs=1, merkle_chunk=None, algos=None):
+    return list(iter_generate_folder(folder, threaded, jobs, merkle_chunk, algos))
+
+def save_baseline(entries, outfile=BASELINE_FILE, root=None, algos=None):
+    # entries may be any iterable; NDJSON, binary and SQLite baselines are
+    # written as entries arrive, the legacy JSON list is written at the end.
+    # SQLite baselines replace the CLI rows in one transaction at the end.
+    with open_writer(outfile, root, algos or HASH_ALGOS) as writer:
+        for entry in entries:
+            writer.write(entry)
     print(f"Baseline saved to {outfile}")
 
 def load_baseline(infile=BASELINE_FILE):
-    if not os.path.exists(infile):
-        return []
-    with open(infile, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return list(iter_baseline(infile))
 
-def verify_file_against_entry(path, entry):
+def find_entry(infile, path):
+    if is_sqlite_path(infile):
+        if not os.path.exists(infile):
+            return None
+        return BaselineStore(infile).get_by_path(path)
+    return next((e for e in iter_baseline(infile) if e["path"] == path), None)
+
+def verify_file_against_entry(path, entry, threaded=False, policy="all"):
+    """Check the entry's digests in the passes chosen by ``policy``; later passes are
+    skipped once one mismatches, so results may hold only some of the algorithms."""
     results = {}
-    for algo in HASH_ALGOS:
-        actual = calc_hash(path, algo)
-        expected = entry.get(algo)
-        results[algo] = {"expected": expected, "actual": actual, "match": actual == expected}
-    return results
+    recorded = entry_algos(entry) or HASH_ALGOS
+    for algos in plan_verify(recorded, policy):
+        actuals = hash_file(path, algos, threaded=threaded)
+        for algo in algos:
+            actual = actuals[algo]
+            expected = entry.get(algo)
+            results[algo] = {"expected": expected, "actual": actual, "match": actual == expected}
+        if not all(results[algo]["match"] for algo in algos):
+            break
+    # Report in the baseline's algo order, whatever order the passes ran in
+    return {algo: results[algo] for algo in recorded if algo in results}
+
+def paranoid_coverage(baseline_file, fraction, shard=None):
+    """Rotation state for --paranoid-sample, kept next to the baseline like --sample-fraction's.
+
+    Each run rehashes the next bucket(s) of unchanged files not yet covered in
+    this cycle, so every file is rehashed once per ceil(1/fraction) runs however
+    often the verify is scheduled.
+    """
+    suffix = (".shard-%d-of-%d" % shard if shard else "") + ".paranoid" + COVERAGE_SUFFIX
+    return Coverage(baseline_file + suffix, fraction)
+
+def paranoid_selected(path, coverage, selected):
+    """True if path falls in this run's buckets of the --paranoid-sample rotation."""
+    return coverage is not None and bucket_of(path, coverage.buckets) in selected
+
+def verify_entry(entry, threaded=False, fast=False, paranoid=None, policy="all"):
+    """Return (path, status) for one baseline entry; status is ORIGINAL, MODIFIED, MISSING or ERROR.
+
+    With ``fast``, entries whose recorded stat tuple still matches are reported
+    ORIGINAL without rehashing, except for the paths ``paranoid(path)`` picks
+    from the rotating --paranoid-sample.
+    """
+    path = entry["path"]
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return path, "MISSING"
+    except OSError:
+        return path, "ERROR"
+    if fast and all(f in entry for f in STAT_FIELDS):
+        if st.st_size != entry["size"]:
+            return path, "MODIFIED"
+        if stat_signature(st) == {f: entry[f] for f in STAT_FIELDS} and not (paranoid and paranoid(path)):
+            return path, "ORIGINAL"
+    if "merkle" in entry:
+        # Chunks hash in parallel and the first bad chunk settles the answer
+        try:
+            return path, "MODIFIED" if changed_ranges(path, entry["merkle"], stop_early=True) else "ORIGINAL"
+        except OSError:
+            return path, "ERROR"
+    try:
+        results = verify_file_against_entry(path, entry, threaded, policy)
+    except OSError:
+        return path, "ERROR"
+    all_match = all(r["match"] for r in results.values())
+    return path, "ORIGINAL" if all_match else "MODIFIED"
+
+def triage_entry(entry, random_blocks, seed):
+    """Spot-check a Merkle entry: size, then its first, last and ``random_blocks`` random chunks.
+
+    Returns (path, status) where TRIAGED means the sampled chunks matched; only
+    a full pass can report ORIGINAL.
+    """
+    path = entry["path"]
+    tree = entry["merkle"]
+    try:
+        if os.path.getsize(path) != tree["size"]:
+            return path, "MODIFIED"
+        indices = triage_chunks(len(tree["leaves"]), random_blocks, f"{seed}:{path}")
+        return path, "MODIFIED" if check_chunks(path, tree, indices) else "TRIAGED"
+    except FileNotFoundError:
+        return path, "MISSING"
+    except OSError:
+        return path, "ERROR"
 
 def main():
     p = argparse.ArgumentParser(description="Simple File Integrity Checker (CLI)")
     p.add_argument("--generate", help="Generate baseline for a single file", metavar="FILE")
     p.add_argument("--generate-folder", help="Generate baseline for all files in folder", metavar="FOLDER")
+    p.add_argument("--archives", action="store_true",
+                   help="With --generate/--generate-folder, hash the members of tar/zip archives "
+                        "(keyed ARCHIVE!/MEMBER) instead of the archive file")
+    p.add_argument("--resume", action="store_true",
+                   help="With --generate-folder, continue from the checkpoint of an interrupted run")
     p.add_argument("--verify", help="Verify a single file against baseline", metavar="FILE")
     p.add_argument("--verify-all", action="store_true", help="Verify all files from baseline")
     p.add_argument("--baseline", help="Baseline file path (default baseline.json)", metavar="BASE")
+    p.add_argument("--threaded", action="store_true", help="Run each digest's updates on a separate thread")
+    p.add_argument("--algos", default=",".join(HASH_ALGOS), metavar="LIST",
+                   help="Comma-separated digests to record when generating (default md5,sha1,sha256; "
+                        "supported: " + ", ".join(SUPPORTED_ALGOS) + ")")
+    p.add_argument("--verify-policy", choices=VERIFY_POLICIES, metavar="POLICY",
+                   help="Which digests to check: all, cheapest-first or one-strong "
+                        "(default: all for --verify, one-strong for --verify-all/--watch)")
+    p.add_argument("--jobs", type=int, default=os.cpu_count() or 1, metavar="N",
+                   help="Number of files hashed in parallel (default: number of CPUs)")
+    p.add_argument("--fast", action="store_true",
+                   help="With --verify-all, only rehash files whose size/mtime/ctime/inode changed")
+    p.add_argument("--paranoid-sample", type=float, default=0.0, metavar="P",
+                   help="With --fast, still rehash a rotating fraction P (0-1) of unchanged files")
+    p.add_argument("--sample-fraction", type=float, metavar="F",
+                   help="With --verify-all, fully rehash only a rotating F of the entries per run "
+                        "(tracked in <baseline>.coverage)")
+    p.add_argument("--coverage-window", type=int, metavar="K",
+                   help="With --sample-fraction, guarantee every entry is rehashed within K runs (default 1/F)")
+    p.add_argument("--sample-blocks", type=int, default=0, metavar="N",
+                   help="With --sample-fraction, triage Merkle entries outside this run's sample by hashing "
+                        "their first, last and N random chunks")
+    p.add_argument("--merkle", action="store_true",
+                   help="Store a per-chunk Merkle tree for files larger than one chunk")
+    p.add_argument("--merkle-only", action="store_true",
+                   help="With --merkle, files that get a tree store only the tree, no whole-file digests: "
+                        "generation hashes on every core, but --diff needs whole-file digests")
+    p.add_argument("--chunk-size", type=int, default=CHUNK_SIZE // (1024 * 1024), metavar="MIB",
+                   help="Merkle chunk size in MiB (default 4)")
+    p.add_argument("--io-order", choices=io_sched.IO_ORDERS, default="path",
+                   help="Hash files in path order (default) or inode order, which seeks less on spinning disks")
+    p.add_argument("--max-bandwidth", type=_bandwidth, metavar="RATE",
+                   help="Cap total hashing read throughput, e.g. 50M or 1G (bytes per second)")
+    p.add_argument("--ionice", type=_ionice, metavar="CLASS",
+                   help="I/O priority for this scan: idle, be or be:0-7 (Linux)")
+    p.add_argument("--drop-cache", action="store_true",
+                   help="Tell the kernel to drop each file from the page cache once hashed")
+    p.add_argument("--shard", type=parse_shard, metavar="I/N",
+                   help="With --verify-all, only check entries in shard I of N (0 <= I < N, by path hash)")
+    p.add_argument("--results", metavar="FILE",
+                   help="Write --verify-all results (or the merged results) as NDJSON to FILE")
+    p.add_argument("--merge-results", nargs="+", metavar="FILE",
+                   help="Merge per-shard --results files into one report with totals")
+    p.add_argument("--local-shards", type=int, metavar="N",
+                   help="With --verify-all, run N shard worker processes on this machine and merge them")
+    p.add_argument("--watch", action="store_true",
+                   help="Watch baselined files with inotify and rehash them when they change")
+    p.add_argument("--debounce", type=float, default=DEBOUNCE_SECONDS, metavar="SECONDS",
+                   help="With --watch, wait until a file has been quiet this long before rehashing (default 1.0)")
+    p.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"),
+                   help="Compare two baselines (any format) and print added/removed/modified/moved files as NDJSON")
+    p.add_argument("--import-json", help="Import a CLI or web JSON baseline into the SQLite store", metavar="JSON")
+    p.add_argument("--export-json", help="Export the SQLite store to a JSON baseline", metavar="JSON")
+    p.add_argument("--export-format", choices=["cli", "web"], default="cli",
+                   help="JSON layout for --export-json: CLI list or web per-user dict (default cli)")
+    p.add_argument("--user", default=CLI_USER, help="Web username for --import-json/--export-json of a list baseline")
+    p.add_argument("--profile", action="store_true",
+                   help="Print a throughput summary, per-phase times and the slowest files to stderr")
+    p.add_argument("--profile-out", metavar="FILE",
+                   help="Also write a cProfile dump (main thread only; use --jobs 1 to include hashing)")
     args = p.parse_args()
 
+    if not (args.profile or args.profile_out):
+        run(p, args)
+        return
+    profiler = cProfile.Profile() if args.profile_out else None
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        run(p, args)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile_out)
+        print_profile(time.perf_counter() - start, args.profile_out)
+
+def print_profile(elapsed, profile_out=None, out=sys.stderr):
+    files = metrics.REGISTRY.counter("fic_files_hashed_total")
+    nbytes = metrics.REGISTRY.counter("fic_bytes_hashed_total")
+    elapsed = max(elapsed, 1e-9)
+    print(f"\nProfile: {files} files, {nbytes / 1e6:.1f} MB hashed in {elapsed:.2f} s "
+          f"({files / elapsed:.1f} files/s, {nbytes / 1e6 / elapsed:.1f} MB/s)", file=out)
+    print("Phase totals (summed across workers):", file=out)
+    for phase, (seconds, count) in sorted(metrics.REGISTRY.phase_totals().items(), key=lambda kv: -kv[1][0]):
+        print(f"  {phase:8} {seconds:10.3f} s  over {count} calls", file=out)
+    slowest = metrics.SLOWEST.items()
+    if slowest:
+        print("Slowest files:", file=out)
+        for path, seconds, size in slowest[:10]:
+            print(f"  {seconds:8.3f} s  {size / 1e6:10.1f} MB  {path}", file=out)
+    if profile_out:
+        print(f"cProfile data written to {profile_out}", file=out)
+
+def _bandwidth(text):
+    try:
+        return io_sched.parse_bandwidth(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def _ionice(text):
+    try:
+        return io_sched.parse_ionice(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def run_local_shards(args, baseline_file, policy):
+    """Drive ``--local-shards`` worker processes, then merge and print their results."""
+    count = args.local_shards
+    jobs = max(1, args.jobs // count)
+
+    def command_for(index, result_path):
+        cmd = [
+            sys.executable, os.path.abspath(__file__), "--verify-all",
+            "--baseline", baseline_file, "--shard", f"{index}/{count}", "--results", result_path,
+            "--jobs", str(jobs), "--verify-policy", policy, "--paranoid-sample", str(args.paranoid_sample),
+        ]
+        cmd += ["--io-order", args.io_order] + ["--drop-cache"] * args.drop_cache
+        if args.sample_fraction is not None:
+            cmd += ["--sample-fraction", str(args.sample_fraction), "--sample-blocks", str(args.sample_blocks)]
+            cmd += ["--coverage-window", str(args.coverage_window)] if args.coverage_window is not None else []
+        if args.max_bandwidth:
+            cmd += ["--max-bandwidth", str(max(1, args.max_bandwidth // count))]
+        if args.ionice:
+            cmd += ["--ionice", "%s:%d" % args.ionice]
+        return cmd + ["--fast"] * args.fast + ["--threaded"] * args.threaded
+
+    with tempfile.TemporaryDirectory(prefix="fic-shards-") as workdir:
+        try:
+            paths = run_local(command_for, count, workdir)
+        except RuntimeError as e:
+            print(f"[ERROR] {e}")
+            return 2
+        return print_merged(merge_results(paths, args.results))
+
+def group_key(entry):
+    # Members of one archive share a shard and a sample bucket, so it is streamed once
+    return entry.get("archive") or entry["path"]
+
+def split_archive_members(entries, archived):
+    """Pass plain entries through; collect archive member entries into ``archived`` by archive."""
+    for entry in entries:
+        if "archive" in entry:
+            archived.setdefault(entry["archive"], []).append(entry)
+        else:
+            yield entry
+
+def sampled_plan(entries, coverage, selected, args, policy):
+    """Filter entries and pick the check for each under --sample-fraction.
+
+    Entries in this run's buckets are fully rehashed. The rest get a chunk
+    triage (--sample-blocks, Merkle entries only), else a stat check (--fast),
+    else nothing.
+    """
+    def in_sample(entry):
+        return bucket_of(group_key(entry), coverage.buckets) in selected
+
+    def wanted(entry):
+        if in_sample(entry):
+            return True
+        # Archive members are only ever checked by streaming their whole archive
+        return "archive" not in entry and (args.fast or (args.sample_blocks and "merkle" in entry))
+
+    seed = coverage.seed()
+
+    def work(entry):
+        if in_sample(entry):
+            return verify_entry(entry, args.threaded, policy=policy)
+        if args.sample_blocks and "merkle" in entry:
+            return triage_entry(entry, args.sample_blocks, seed)
+        return verify_entry(entry, args.threaded, True, None, policy)
+
+    return (e for e in entries if wanted(e)), work
+
+def print_merged(report):
+    """Print a merged shard report; return the exit code (0 clean, 1 changes found, 2 shards missing)."""
+    for row in report["problems"]:
+        if row["status"] in ("MISSING", "ERROR"):
+            print(f"[{row['status']}] {row['path']}")
+        else:
+            print(f"{row['status']} - {row['path']}")
+    counts = report["counts"]
+    print(f"Total: {report['total']} files in {report['shards']} shards - "
+          + ", ".join(f"{status} {n}" for status, n in counts.items()))
+    if report["missing"] or report["incomplete"]:
+        print(f"[INCOMPLETE] missing shards: {report['missing'] or '-'}, "
+              f"unfinished shards: {report['incomplete'] or '-'}")
+        return 2
+    return 1 if any(counts.get(status) for status in ("MODIFIED", "MISSING", "ERROR")) else 0
+
+def run(p, args):
     baseline_file = args.baseline or BASELINE_FILE
+    merkle_chunk = args.chunk_size * 1024 * 1024 if args.merkle else None
+    if args.merkle_only and not args.merkle:
+        p.error("--merkle-only requires --merkle")
+    algos = [a.strip().lower() for a in args.algos.split(",") if a.strip()]
+    unknown = [a for a in algos if a not in SUPPORTED_ALGOS]
+    if unknown or not algos:
+        p.error(f"unsupported --algos: {', '.join(unknown) or args.algos}")
+    if args.sample_fraction is None:
+        if args.coverage_window is not None or args.sample_blocks:
+            p.error("--coverage-window and --sample-blocks require --sample-fraction")
+    elif not 0 < args.sample_fraction <= 1:
+        p.error("--sample-fraction must be in (0, 1]")
+    elif args.coverage_window is not None and args.coverage_window < 1:
+        p.error("--coverage-window must be at least 1")
+    if args.sample_blocks < 0:
+        p.error("--sample-blocks must not be negative")
+    bulk_policy = args.verify_policy or "one-strong"
+    io_sched.configure(args.max_bandwidth, args.drop_cache)
+    if args.ionice:
+        try:
+            io_sched.set_ionice(*args.ionice)
+        except OSError as e:
+            print(f"Warning: could not set --ionice: {e}")
+
+    if args.diff:
+        old_file, new_file = args.diff
+        missing = [path for path in args.diff if not os.path.exists(path)]
+        if missing:
+            print(f"[ERROR] baseline not found: {', '.join(missing)}")
+            sys.exit(2)
+        try:
+            for change in diff_baselines(iter_baseline(old_file), iter_baseline(new_file)):
+                print(json.dumps(change), flush="summary" in change)
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            sys.exit(2)
+        return
+
+    if args.import_json or args.export_json:
+        db_file = baseline_file if is_sqlite_path(baseline_file) else DB_FILE
+        store = BaselineStore(db_file)
+        if args.import_json:
+            count = store.import_json(args.import_json, args.user)
+            print(f"Imported {count} entries from {args.import_json} into {db_file}")
+        else:
+            username = None if args.export_format == "web" else args.user
+            data = store.export_json(args.export_json, username)
+            print(f"Exported {len(data)} {'users' if username is None else 'entries'} to {args.export_json}")
+        return
 
     if args.generate:
-        entry = generate_baseline_for_file(args.generate)
-        save_baseline([entry], baseline_file)
+        if args.archives and is_archive(args.generate):
+            save_baseline(generate_archive_entries(args.generate, algos, args.threaded), baseline_file, algos=algos)
+            return
+        entry = generate_baseline_for_file(args.generate, args.threaded, merkle_chunk, algos, args.merkle_only)
+        save_baseline([entry], baseline_file, algos=algos)
         return
 
     if args.generate_folder:
-        entries = generate_baseline_for_folder(args.generate_folder)
-        save_baseline(entries, baseline_file)
+        # Progress is journaled next to the baseline so a crash or Ctrl-C can be resumed
+        checkpoint = Checkpoint(baseline_file + CHECKPOINT_SUFFIX, {
+            "root": os.path.abspath(args.generate_folder), "algos": algos, "merkle_chunk": merkle_chunk,
+            "archives": args.archives, "merkle_only": args.merkle_only,
+        })
+        done = checkpoint.open(resume=args.resume)
+        if done:
+            print(f"Resuming: {len(done)} entries checkpointed, last at {next(reversed(done))}")
+        try:
+            entries = iter_generate_folder(args.generate_folder, args.threaded, args.jobs, merkle_chunk, algos, done,
+                                           args.io_order, args.archives, args.merkle_only)
+            save_baseline(checkpoint.track(entries, done), baseline_file, root=args.generate_folder, algos=algos)
+        except KeyboardInterrupt:
+            checkpoint.close(False)
+            print(f"\nInterrupted; progress is saved in {checkpoint.path}, rerun with --resume to continue")
+            sys.exit(130)
+        except BaseException:
+            checkpoint.close(False)
+            raise
+        checkpoint.close(True)
         return
 
     if args.verify:
-        entries = load_baseline(baseline_file)
         # find matching entry by path
-        path_abs = os.path.abspath(args.verify)
-        entry = next((e for e in entries if e["path"] == path_abs), None)
+        path_abs = abs_member_path(args.verify) if MEMBER_SEP in args.verify else os.path.abspath(args.verify)
+        entry = find_entry(baseline_file, path_abs)
         if not entry:
             print("File not found in baseline. You can generate baseline first.")
             return
-        results = verify_file_against_entry(path_abs, entry)
+        if "archive" in entry:
+            [(_, status)] = verify_archive(entry["archive"], [entry], args.threaded)
+            print("STATUS:", status)
+            return
+        if "merkle" in entry and not entry_algos(entry):
+            # --merkle-only entry: the tree is the only record of the content
+            ranges = changed_ranges(path_abs, entry["merkle"])
+            for start, end in ranges:
+                print(f"CHANGED BYTES: {start}-{end}")
+            print("STATUS:", "MODIFIED" if ranges else "ORIGINAL")
+            return
+        results = verify_file_against_entry(path_abs, entry, args.threaded, args.verify_policy or "all")
         for algo, res in results.items():
             print(f"{algo.upper()}: expected={res['expected']} actual={res['actual']} match={res['match']}")
         all_match = all(r["match"] for r in results.values())
         print("STATUS:", "ORIGINAL" if all_match else "MODIFIED")
+        if not all_match and "merkle" in entry:
+            for start, end in changed_ranges(path_abs, entry["merkle"]):
+                print(f"CHANGED BYTES: {start}-{end}")
         return
 
+    if args.merge_results:
+        try:
+            report = merge_results(args.merge_results, args.results)
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] {e}")
+            sys.exit(2)
+        sys.exit(print_merged(report))
+
+    if args.verify_all and args.local_shards:
+        if args.local_shards < 1:
+            p.error("--local-shards must be at least 1")
+        sys.exit(run_local_shards(args, baseline_file, bulk_policy))
+
     if args.verify_all:
-        entries = load_baseline(baseline_file)
+        entries = iter_baseline(baseline_file)
+        first = next(entries, None)
+        if first is None:
+            print("No baseline found.")
+            return
+        entries = itertools.chain([first], entries)
+        if args.shard:
+            index, count = args.shard
+            entries = (e for e in entries if shard_of(group_key(e), count) == index)
+        paranoid = paranoid_run = None
+        if args.fast and args.paranoid_sample > 0 and args.sample_fraction is None:
+            if args.paranoid_sample > 1:
+                p.error("--paranoid-sample must be in [0, 1]")
+            paranoid = paranoid_coverage(baseline_file, args.paranoid_sample, args.shard)
+            paranoid_run = set(paranoid.start_run())
+            print(f"Paranoid sample: buckets {sorted(paranoid_run)} of {paranoid.buckets} ({paranoid.describe()})")
+        in_paranoid = lambda path: paranoid_selected(path, paranoid, paranoid_run)
+        work = lambda entry: verify_entry(entry, args.threaded, args.fast, in_paranoid, bulk_policy)
+        coverage = None
+        if args.sample_fraction is not None:
+            coverage_file = baseline_file + (".shard-%d-of-%d" % args.shard if args.shard else "") + COVERAGE_SUFFIX
+            try:
+                coverage = Coverage(coverage_file, args.sample_fraction, args.coverage_window)
+            except ValueError as e:
+                p.error(str(e))
+            selected = set(coverage.start_run())
+            print(f"Sampling buckets {sorted(selected)} of {coverage.buckets} ({coverage.describe()})")
+            entries, work = sampled_plan(entries, coverage, selected, args, bulk_policy)
+        archived = {}
+        entries = split_archive_members(entries, archived)
+        if args.io_order == "inode":
+            entries = io_sched.by_inode(entries)
+        results = ResultWriter(args.results, args.shard or (0, 1), baseline_file) if args.results else None
+
+        def report(path, status):
+            if results:
+                results.add(path, status)
+            if status in ("MISSING", "ERROR"):
+                print(f"[{status}] {path}")
+            else:
+                print(f"{status} - {path}")
+
+        try:
+            for path, status in ordered_map(work, entries, args.jobs):
+                report(path, status)
+            # Then each archive once, all of its members in a single streaming pass
+            check_archive = lambda item: verify_archive(item[0], item[1], args.threaded)
+            for checked in ordered_map(check_archive, archived.items(), args.jobs):
+                for path, status in checked:
+                    report(path, status)
+        except BaseException:
+            if results:
+                results.close(commit=False)
+            raise
+        if results:
+            results.close()
+        if coverage:
+            coverage.finish_run(selected)
+            print(f"Coverage: {coverage.describe()}")
+        if paranoid:
+            paranoid.finish_run(paranoid_run)
+        return
+
+    if args.watch:
+        # Archive members have no file of their own to watch
+        entries = [e for e in load_baseline(baseline_file) if "archive" not in e]
         if not entries:
             print("No baseline found.")
             return
-        for entry in entries:
-            path = entry["path"]
-            if not os.path.exists(path):
-                print(f"[MISSING] {path}")
-                continue
-            results = verify_file_against_entry(path, entry)
-            all_match = all(r["match"] for r in results.values())
-            status = "ORIGINAL" if all_match else "MODIFIED"
-            print(f"{status} - {path}")
+        watcher = Watcher(entries, lambda entry: verify_entry(entry, args.threaded, policy=bulk_policy),
+                          jobs=args.jobs, debounce=args.debounce)
+        dirs = watcher.start()
+        print(f"Watching {len(watcher.entries)} files in {dirs} directories. Press Ctrl-C to stop.", flush=True)
+        watcher.run()
         return
 
     p.print_help()
@@ -0,0 +1,213 @@
+"""
+hash_engine.py
+Single-pass multi-digest hashing shared by cli_checker.py and web_checker.py.
+
+Each file is read once into a reused buffer and every requested digest is fed
+from the same block, instead of reopening the file once per algorithm.
+"""
+
+import hashlib
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import io_sched
+import metrics
+
+DEFAULT_ALGOS = ["md5", "sha1", "sha256"]
+BLOCK_SIZE = 1024 * 1024
+
+# crc32 is a non-cryptographic pre-check: cheap, but only good for spotting change.
+# md5 and sha1 are accepted for compatibility, not counted as strong.
+SUPPORTED_ALGOS = ["crc32", "md5", "sha1", "sha256", "sha512", "blake2b", "blake2s", "sha3_256"]
+STRONG_ALGOS = {"sha256", "sha512", "blake2b", "blake2s", "sha3_256"}
+VERIFY_POLICIES = ["all", "cheapest-first", "one-strong"]
+
+class _Crc32:
+    name = "crc32"
+    digest_size = 4
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def digest(self):
+        return self.value.to_bytes(4, "big")
+
+    def hexdigest(self):
+        return self.digest().hex()
+
+def new_hasher(algo):
+    """hashlib-style object for any name in SUPPORTED_ALGOS."""
+    if algo == "crc32":
+        return _Crc32()
+    return hashlib.new(algo)
+
+def entry_algos(entry):
+    """Digest algorithms recorded in a baseline entry."""
+    return [algo for algo in SUPPORTED_ALGOS if entry.get(algo)]
+
+_costs = {}
+_costs_lock = threading.Lock()
+
+def algo_cost(algo):
+    # Relative speed depends on the CPU (SHA-NI makes sha256 faster than
+    # blake2b, for example), so time each algo once on this host.
+    with _costs_lock:
+        if algo not in _costs:
+            sample = bytes(BLOCK_SIZE)
+            h = new_hasher(algo)
+            start = time.perf_counter()
+            for _ in range(4):
+                h.update(sample)
+            _costs[algo] = time.perf_counter() - start
+        return _costs[algo]
+
+def order_by_cost(algos):
+    return sorted(algos, key=algo_cost)
+
+def plan_verify(algos, policy="all"):
+    """Split ``algos`` into hashing passes for a verify policy; stop at the first pass that mismatches.
+
+    all:            every digest in one pass, in the given order
+    cheapest-first: the cheapest digest alone, then the rest only if it matched
+    one-strong:     only the cheapest strong digest (falls back to all if none)
+
+    Cost order only decides how the passes are split; within a pass the
+    digests keep the order of ``algos``.
+    """
+    if policy not in VERIFY_POLICIES:
+        raise ValueError(f"unknown verify policy: {policy}")
+    if policy == "all":
+        return [list(algos)]
+    ordered = order_by_cost(algos)
+    if policy == "cheapest-first" and len(ordered) > 1:
+        return [ordered[:1], [algo for algo in algos if algo != ordered[0]]]
+    if policy == "one-strong":
+        strong = [algo for algo in ordered if algo in STRONG_ALGOS]
+        if strong:
+            return [strong[:1]]
+    return [list(algos)]
+
+_pool = None
+_pool_size = 0
+_pool_busy = 0
+_pool_lock = threading.Lock()
+
+@contextmanager
+def _digest_pool(width):
+    # hashlib releases the GIL for large updates, so a shared pool lets the
+    # digests of one block run on separate cores. The pool grows to the peak
+    # number of concurrent digest updates (e.g. --jobs x algos), so parallel
+    # callers never queue behind each other; a replaced, smaller pool finishes
+    # its in-flight work and is dropped.
+    global _pool, _pool_size, _pool_busy
+    with _pool_lock:
+        _pool_busy += width
+        if _pool is None or _pool_size < _pool_busy:
+            _pool_size = _pool_busy
+            _pool = ThreadPoolExecutor(max_workers=_pool_size, thread_name_prefix="digest")
+        pool = _pool
+    try:
+        yield pool
+    finally:
+        with _pool_lock:
+            _pool_busy -= width
+
+class MultiHasher:
+    """Feeds one stream of bytes to several hashlib digests at once."""
+
+    def __init__(self, algos=DEFAULT_ALGOS, threaded=False):
+        self.hashers = {algo: new_hasher(algo) for algo in algos}
+        self.threaded = threaded and len(self.hashers) > 1
+        self.nbytes = 0
+
+    def update(self, data):
+        if self.threaded:
+            # Wait for every digest before returning: callers reuse the buffer.
+            with _digest_pool(len(self.hashers)) as pool:
+                list(pool.map(lambda h: h.update(data), self.hashers.values()))
+        else:
+            for h in self.hashers.values():
+                h.update(data)
+        self.nbytes += len(data)
+
+    def hexdigests(self):
+        return {algo: h.hexdigest() for algo, h in self.hashers.items()}
+
+def hash_fileobj(f, algos=DEFAULT_ALGOS, block_size=BLOCK_SIZE, threaded=False):
+    """Hash an open binary file with every algo in ``algos`` in a single pass."""
+    hasher = MultiHasher(algos, threaded)
+    buf = bytearray(block_size)
+    view = memoryview(buf)
+    read_time = digest_time = 0.0
+    while True:
+        t0 = time.perf_counter()
+        n = f.readinto(buf)
+        # Throttle waits count as read time: they stand in for a slower disk
+        io_sched.throttle(n)
+        t1 = time.perf_counter()
+        read_time += t1 - t0
+        if not n:
+            break
+        hasher.update(view[:n])
+        digest_time += time.perf_counter() - t1
+    metrics.observe("fic_phase_seconds", read_time, phase="read")
+    metrics.observe("fic_phase_seconds", digest_time, phase="digest")
+    return hasher.hexdigests()
+
+def hash_file(path, algos=DEFAULT_ALGOS, block_size=None, threaded=False):
+    """Return ``{algo: hexdigest}`` for ``path``, reading the file exactly once.
+
+    ``block_size`` defaults to a read size adapted to the file's size (see io_sched).
+    """
+    start = time.perf_counter()
+    with metrics.timed("open"):
+        f = open(path, "rb", buffering=0)
+    with f:
+        fd = f.fileno()
+        io_sched.advise_open(fd)
+        if block_size is None:
+            block_size = io_sched.read_size(os.fstat(fd).st_size, BLOCK_SIZE)
+        digests = hash_fileobj(f, algos, block_size, threaded)
+        metrics.record_file(path, time.perf_counter() - start, f.tell())
+        io_sched.advise_done(fd)
+    return digests
+
+class HashingWriter:
+    """Write-side tee: each chunk written updates every digest and, if set, ``sink``.
+
+    Lets a stream be hashed as it arrives (e.g. an HTTP upload) instead of being
+    saved first and read back. With ``sink=None`` the bytes are only hashed.
+    """
+
+    def __init__(self, algos=DEFAULT_ALGOS, sink=None):
+        self.hasher = MultiHasher(algos)
+        self.sink = sink
+
+    def write(self, data):
+        self.hasher.update(data)
+        if self.sink is not None:
+            self.sink.write(data)
+        return len(data)
+
+    def read(self, size=-1):
+        return self.sink.read(size) if self.sink is not None else b""
+
+    def readline(self, size=-1):
+        return self.sink.readline(size) if self.sink is not None else b""
+
+    def seek(self, offset, whence=0):
+        return self.sink.seek(offset, whence) if self.sink is not None else 0
+
+    def hexdigests(self):
+        return self.hasher.hexdigests()
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
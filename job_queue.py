@@ -0,0 +1,166 @@
+"""
+job_queue.py
+Background job queue for the web batch API.
+
+A job is a list of tasks (callables returning a result dict) submitted
+together; tasks run on the submitting process's worker pool and results are
+appended as they finish, so clients can poll or stream them while the rest
+still run. Jobs and results live in SQLite (app.db by default), so a poll or
+stream that lands on another gunicorn worker sees the same job.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from baseline_store import DB_FILE
+
+JOB_TTL_SECONDS = 3600
+# A job not finished this long after it was created is given up on: its worker
+# died or restarted, or a result could not be stored
+JOB_DEADLINE_SECONDS = JOB_TTL_SECONDS
+# How often a waiter rechecks the database for results written by another worker
+POLL_SECONDS = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS job_results (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_results_job ON job_results(job_id, seq);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created);
+"""
+
+class Job:
+    """Handle on one stored job; every read goes to the database."""
+
+    def __init__(self, queue, job_id, owner, total, created):
+        self.queue = queue
+        self.id = job_id
+        self.owner = owner
+        self.total = total
+        self.deadline = created + JOB_DEADLINE_SECONDS
+
+    @property
+    def expired(self):
+        return time.time() >= self.deadline
+
+    def results_from(self, since=0):
+        rows = self.queue._conn().execute(
+            "SELECT result FROM job_results WHERE job_id = ? ORDER BY seq LIMIT -1 OFFSET ?",
+            (self.id, since),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def wait_for(self, count, timeout=None):
+        """Block until more than ``count`` results exist (or the job is done or expired); return them from ``count`` on."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            results = self.results_from(count)
+            if results or count >= self.total or self.expired:
+                return results
+            remaining = POLL_SECONDS if deadline is None else min(POLL_SECONDS, deadline - time.monotonic())
+            if remaining <= 0:
+                return results
+            # Woken at once by results from this process; others are seen on the next poll
+            with self.queue._cond:
+                self.queue._cond.wait(remaining)
+
+    def snapshot(self, since=0):
+        completed = self.queue._conn().execute(
+            "SELECT COUNT(*) FROM job_results WHERE job_id = ?", (self.id,)
+        ).fetchone()[0]
+        snapshot = {
+            "job_id": self.id,
+            "total": self.total,
+            "completed": completed,
+            "done": completed >= self.total,
+            "results": self.results_from(since),
+        }
+        if not snapshot["done"] and self.expired:
+            snapshot.update(done=True, error="job did not finish before its deadline")
+        return snapshot
+
+class JobQueue:
+    def __init__(self, workers, db_path=DB_FILE):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.db_path = db_path
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, owner, tasks):
+        """Queue ``tasks`` (zero-argument callables) as one job and return it immediately."""
+        self._purge()
+        now = time.time()
+        job = Job(self, uuid.uuid4().hex, owner, len(tasks), now)
+        self._conn().execute(
+            "INSERT INTO jobs (id, owner, total, created, finished) VALUES (?, ?, ?, ?, ?)",
+            (job.id, owner, job.total, now, now if job.total == 0 else None),
+        )
+        for index, task in enumerate(tasks):
+            self.pool.submit(self._run, job, index, task)
+        return job
+
+    def get(self, job_id, owner):
+        row = self._conn().execute(
+            "SELECT total, created FROM jobs WHERE id = ? AND owner = ?", (job_id, owner)
+        ).fetchone()
+        return Job(self, job_id, owner, row[0], row[1]) if row else None
+
+    def _run(self, job, index, task):
+        try:
+            result = task()
+        except Exception as e:
+            result = {"status": "ERROR", "error": str(e)}
+        result["index"] = index
+        self._add_result(job, result)
+
+    def _add_result(self, job, result):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO job_results (job_id, result) VALUES (?, ?)", (job.id, json.dumps(result)))
+            conn.execute(
+                "UPDATE jobs SET finished = ? WHERE id = ? AND total <= "
+                "(SELECT COUNT(*) FROM job_results WHERE job_id = ?)",
+                (time.time(), job.id, job.id),
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        with self._cond:
+            self._cond.notify_all()
+
+    def _purge(self):
+        # Finished jobs are kept for JOB_TTL_SECONDS; unfinished ones as long past their deadline
+        now = time.time()
+        stale = "finished < ? OR (finished IS NULL AND created < ?)"
+        params = (now - JOB_TTL_SECONDS, now - JOB_DEADLINE_SECONDS - JOB_TTL_SECONDS)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(f"DELETE FROM job_results WHERE job_id IN (SELECT id FROM jobs WHERE {stale})", params)
+        conn.execute(f"DELETE FROM jobs WHERE {stale}", params)
+        conn.execute("COMMIT")
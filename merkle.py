@@ -0,0 +1,288 @@
+"""
+merkle.py
+Chunked Merkle-tree digests for large files.
+
+A tree splits a file into fixed-size chunks (4 MiB by default), stores the
+sha256 of every chunk as a leaf and a root over the leaves. Chunks are hashed
+on a shared thread pool, so one big file uses every core, and verification can
+say exactly which byte ranges changed, or stop at the first bad chunk.
+
+Baseline entries carry the tree under a "merkle" key:
+  {"algo": "sha256", "chunk_size": 4194304, "size": ..., "root": ..., "leaves": [...]}
+"""
+
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import io_sched
+import metrics
+from hash_engine import DEFAULT_ALGOS, MultiHasher
+
+CHUNK_SIZE = 4 * 1024 * 1024
+MERKLE_ALGO = "sha256"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _chunk_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="merkle")
+        return _pool
+
+def _window():
+    return 2 * (os.cpu_count() or 1)
+
+class _ByteBudget:
+    """Process-wide cap on chunk bytes read but not yet hashed by the pool.
+
+    hash_file_with_tree() runs in every --jobs worker at once; without a shared
+    cap each caller's window of chunks would add up to jobs x window x chunk.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, nbytes):
+        # A chunk larger than the whole budget still goes through, alone
+        nbytes = min(nbytes, self.limit)
+        with self._cond:
+            while self.used and self.used + nbytes > self.limit:
+                self._cond.wait()
+            self.used += nbytes
+        return nbytes
+
+    def release(self, nbytes):
+        with self._cond:
+            self.used -= nbytes
+            self._cond.notify_all()
+
+    def release_after(self, nbytes, users):
+        """Return a callable that releases ``nbytes`` once it has been called ``users`` times."""
+        lock = threading.Lock()
+        left = [users]
+
+        def done():
+            with lock:
+                left[0] -= 1
+                last = left[0] == 0
+            if last:
+                self.release(nbytes)
+
+        return done
+
+_inflight = _ByteBudget(_window() * CHUNK_SIZE)
+
+def _budgeted_leaf(data, done):
+    try:
+        return leaf_digest(data)
+    finally:
+        done()
+
+class _WholeFileDigests(threading.Thread):
+    """Feeds every chunk, in order, to the whole-file digests on a thread of its own.
+
+    Keeps the sequential md5/sha1/sha256 pass off the read loop, so reading,
+    whole-file digests and chunk leaves overlap. A chunk's budget is released
+    by whichever of this thread and its leaf task finishes with it last.
+    """
+
+    def __init__(self, algos, threaded):
+        super().__init__(name="merkle-digest", daemon=True)
+        self.hasher = MultiHasher(algos, threaded)
+        self.chunks = queue.Queue()
+        self.error = None
+
+    def run(self):
+        for chunk, done in iter(self.chunks.get, None):
+            try:
+                if self.error is None:
+                    self.hasher.update(chunk)
+            except BaseException as e:
+                self.error = e
+            finally:
+                done()
+
+    def finish(self):
+        self.chunks.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.hasher.hexdigests()
+
+def leaf_digest(data):
+    # 0x00 / 0x01 prefixes keep leaf and inner-node hashes from colliding
+    h = hashlib.new(MERKLE_ALGO)
+    h.update(b"\x00")
+    h.update(data)
+    return h.hexdigest()
+
+def merkle_root(leaves):
+    level = [bytes.fromhex(leaf) for leaf in leaves]
+    if not level:
+        return leaf_digest(b"")
+    while len(level) > 1:
+        nxt = []
+        for i in range(0, len(level) - 1, 2):
+            nxt.append(hashlib.new(MERKLE_ALGO, b"\x01" + level[i] + level[i + 1]).digest())
+        if len(level) % 2:
+            nxt.append(level[-1])
+        level = nxt
+    return level[0].hex()
+
+def make_tree(leaves, size, chunk_size=CHUNK_SIZE):
+    return {
+        "algo": MERKLE_ALGO,
+        "chunk_size": chunk_size,
+        "size": size,
+        "root": merkle_root(leaves),
+        "leaves": leaves,
+    }
+
+def hash_file_with_tree(path, algos=DEFAULT_ALGOS, chunk_size=CHUNK_SIZE, threaded=False):
+    """Single read of ``path`` returning (whole-file digests, merkle tree).
+
+    The per-chunk leaves are hashed on the pool, on every core. Whole-file
+    digests are inherently sequential: they run on their own thread alongside
+    the read, so a Merkle generate takes about as long as the slowest of the
+    two, not their sum. With ``algos`` empty no whole-file digests are made
+    and only the tree bounds the run (--merkle-only). Chunks held for either
+    count against a process-wide byte budget.
+    """
+    start = time.perf_counter()
+    whole = _WholeFileDigests(algos, threaded) if algos else None
+    users = 2 if whole else 1
+    pool = _chunk_pool()
+    leaves = []
+    pending = deque()
+    size = 0
+    if whole:
+        whole.start()
+    try:
+        with open(path, "rb") as f:
+            io_sched.advise_open(f.fileno())
+            while True:
+                reserved = _inflight.acquire(chunk_size)
+                try:
+                    chunk = f.read(chunk_size)
+                except BaseException:
+                    _inflight.release(reserved)
+                    raise
+                if not chunk:
+                    _inflight.release(reserved)
+                    break
+                io_sched.throttle(len(chunk))
+                size += len(chunk)
+                done = _inflight.release_after(reserved, users)
+                pending.append(pool.submit(_budgeted_leaf, chunk, done))
+                if whole:
+                    whole.chunks.put((chunk, done))
+                if len(pending) >= _window():
+                    leaves.append(pending.popleft().result())
+            leaves.extend(fut.result() for fut in pending)
+            io_sched.advise_done(f.fileno())
+    except BaseException:
+        if whole:
+            whole.chunks.put(None)
+            whole.join()
+        raise
+    digests = whole.finish() if whole else {}
+    metrics.record_file(path, time.perf_counter() - start, size)
+    return digests, make_tree(leaves, size, chunk_size)
+
+def _leaf_at(fd, index, chunk_size):
+    data = os.pread(fd, chunk_size, index * chunk_size)
+    io_sched.throttle(len(data))
+    return leaf_digest(data)
+
+def _iter_leaves(path, chunk_size, size=None):
+    # Yields (index, leaf) in order while keeping a bounded window of chunks in flight.
+    pool = _chunk_pool()
+    if size is None:
+        size = os.path.getsize(path)
+    count = -(-size // chunk_size)
+    fd = os.open(path, os.O_RDONLY)
+    io_sched.advise_open(fd)
+    pending = deque()
+    try:
+        for index in range(count):
+            pending.append((index, pool.submit(_leaf_at, fd, index, chunk_size)))
+            if len(pending) >= _window():
+                i, fut = pending.popleft()
+                yield i, fut.result()
+        while pending:
+            i, fut = pending.popleft()
+            yield i, fut.result()
+    finally:
+        for _, fut in pending:
+            fut.cancel()
+        for _, fut in pending:
+            if not fut.cancelled():
+                fut.exception()
+        io_sched.advise_done(fd)
+        os.close(fd)
+
+def check_chunks(path, tree, indices):
+    """Rehash only the chunks at ``indices``; return the changed [start, end) ranges among them."""
+    chunk_size = tree["chunk_size"]
+    leaves = tree["leaves"]
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        futures = [(i, _chunk_pool().submit(_leaf_at, fd, i, chunk_size)) for i in indices]
+        changed = [i for i, fut in futures if i >= len(leaves) or fut.result() != leaves[i]]
+    finally:
+        os.close(fd)
+    return _merge_ranges(changed, chunk_size, tree["size"])
+
+def changed_ranges(path, tree, stop_early=False):
+    """Compare ``path`` against a stored tree and return changed [start, end) byte ranges.
+
+    With ``stop_early`` only the first differing range is returned and no
+    further chunks are read, which is enough for an ORIGINAL/MODIFIED answer.
+    """
+    chunk_size = tree["chunk_size"]
+    old_leaves = tree["leaves"]
+    old_size = tree["size"]
+    size = os.path.getsize(path)
+    if stop_early and size != old_size:
+        start = min(size, old_size) // chunk_size * chunk_size
+        return [(start, max(size, old_size))]
+    changed = []
+    for index, digest in _iter_leaves(path, chunk_size, size):
+        if index >= len(old_leaves) or digest != old_leaves[index]:
+            changed.append(index)
+            if stop_early:
+                break
+    new_count = -(-size // chunk_size)
+    if not (stop_early and changed):
+        changed.extend(range(new_count, len(old_leaves)))
+    return _merge_ranges(changed, chunk_size, max(size, old_size))
+
+def _merge_ranges(indices, chunk_size, limit):
+    ranges = []
+    for index in indices:
+        start, end = index * chunk_size, min((index + 1) * chunk_size, limit)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+def diff_trees(old_tree, new_tree):
+    """Byte ranges that differ between two trees built with the same chunk size."""
+    if old_tree["chunk_size"] != new_tree["chunk_size"]:
+        raise ValueError("merkle trees use different chunk sizes")
+    old_leaves, new_leaves = old_tree["leaves"], new_tree["leaves"]
+    changed = [
+        i for i in range(max(len(old_leaves), len(new_leaves)))
+        if i >= len(old_leaves) or i >= len(new_leaves) or old_leaves[i] != new_leaves[i]
+    ]
+    return _merge_ranges(changed, old_tree["chunk_size"], max(old_tree["size"], new_tree["size"]))
@@ -0,0 +1,145 @@
+"""
+metrics.py
+In-process counters and latency histograms shared by the CLI and web app.
+
+Hashing records per-file read/digest time and byte/file counters here; the
+web app exposes everything at /metrics in Prometheus text format, and the
+CLI's --profile prints a summary from the same numbers.
+"""
+
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "fic_phase_seconds": "Time spent per phase (open, read, digest, walk, upload_stream, baseline_lookup, ...)",
+    "fic_request_seconds": "Web request latency by endpoint",
+    "fic_files_hashed_total": "Files hashed",
+    "fic_bytes_hashed_total": "Bytes fed to digests",
+    "fic_upload_dedup_total": "Uploads whose content was already stored",
+    "fic_upload_stored_bytes_total": "Bytes written to the content-addressed upload store",
+}
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def phase_totals(self, name="fic_phase_seconds", label="phase"):
+        """{label value: (total seconds, observations)} for one histogram family."""
+        with self._lock:
+            return {
+                dict(labels).get(label, ""): (hist.sum, hist.count)
+                for (hname, labels), hist in self.histograms.items() if hname == name
+            }
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name in sorted({n for n, _ in self.counters}):
+                _header(lines, name, "counter")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{_labels(labels)} {value}")
+            for name in sorted({n for n, _ in self.histograms}):
+                _header(lines, name, "histogram")
+                for (n, labels), hist in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', repr(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {hist.sum}")
+                    lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+def _header(lines, name, kind):
+    if name in HELP:
+        lines.append(f"# HELP {name} {HELP[name]}")
+    lines.append(f"# TYPE {name} {kind}")
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+class SlowestFiles:
+    """Keeps the ``size`` slowest files seen (path, seconds, bytes)."""
+
+    def __init__(self, size=20):
+        self.size = size
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def record(self, path, seconds, nbytes):
+        with self._lock:
+            item = (seconds, path, nbytes)
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif seconds > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def items(self):
+        with self._lock:
+            return [(path, seconds, nbytes) for seconds, path, nbytes in sorted(self._heap, reverse=True)]
+
+REGISTRY = Registry()
+SLOWEST = SlowestFiles()
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+
+@contextmanager
+def timed(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("fic_phase_seconds", time.perf_counter() - start, phase=phase)
+
+def record_file(path, seconds, nbytes):
+    inc("fic_files_hashed_total")
+    inc("fic_bytes_hashed_total", nbytes)
+    SLOWEST.record(path, seconds, nbytes)
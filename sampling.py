@@ -0,0 +1,96 @@
+"""
+sampling.py
+Rotating sampled verification with a coverage guarantee.
+
+Entries are split into ceil(1/F) buckets by a hash of their path. Each
+--sample-fraction run fully rehashes the next bucket(s) not yet covered in the
+current cycle, and "<baseline>.coverage" records which buckets are done. If
+runs were missed or cut short, later runs take more buckets, so every entry is
+rehashed at least once per window of K runs. A cycle restarts once all
+buckets are covered.
+
+Huge files with a Merkle tree can additionally be triaged between full passes
+by hashing only their first and last chunks plus a few random ones.
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+
+COVERAGE_SUFFIX = ".coverage"
+
+def bucket_of(path, buckets):
+    # Own personalisation, so sample buckets are independent of shards
+    digest = hashlib.blake2b(path.encode("utf-8", "surrogateescape"), digest_size=8, person=b"fic-sample").digest()
+    return int.from_bytes(digest, "big") % buckets
+
+class Coverage:
+    """Persistent rotation state: which buckets this cycle has fully verified."""
+
+    def __init__(self, path, fraction, window=None):
+        if not 0 < fraction <= 1:
+            raise ValueError("--sample-fraction must be in (0, 1]")
+        self.path = path
+        self.buckets = math.ceil(1 / fraction)
+        self.window = window or self.buckets
+        if self.window < 1:
+            raise ValueError("--coverage-window must be at least 1")
+        self.state = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            state = None
+        if not state or state.get("buckets") != self.buckets or state.get("window") != self.window:
+            state = {"buckets": self.buckets, "window": self.window, "cycle": 0, "run": 0, "done": []}
+        return state
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+    def start_run(self):
+        """Pick this run's buckets and count the run; returns the selected bucket ids.
+
+        The run is counted up front so a crashed run still uses up a slot of
+        the window and the remaining runs catch up; buckets are only marked
+        done by finish_run().
+        """
+        state = self.state
+        if len(state["done"]) >= self.buckets:
+            state.update(cycle=state["cycle"] + 1, run=0, done=[])
+        done = set(state["done"])
+        remaining = [b for b in range(self.buckets) if b not in done]
+        # Past the end of the window (runs crashed) everything left is overdue
+        runs_left = max(1, self.window - state["run"])
+        selected = remaining[:math.ceil(len(remaining) / runs_left)]
+        state["run"] += 1
+        self._save()
+        return selected
+
+    def finish_run(self, selected):
+        self.state["done"] = sorted(set(self.state["done"]) | set(selected))
+        self._save()
+
+    def seed(self):
+        return f"{self.state['cycle']}:{self.state['run']}"
+
+    def describe(self):
+        s = self.state
+        return (f"cycle {s['cycle']}, run {s['run']} of {self.window}, "
+                f"{len(s['done'])}/{self.buckets} buckets covered")
+
+def triage_chunks(chunk_count, random_blocks, seed):
+    """Chunk indices to spot-check: first, last and ``random_blocks`` others chosen by ``seed``."""
+    if chunk_count <= 0:
+        return []
+    picked = {0, chunk_count - 1}
+    middle = range(1, chunk_count - 1)
+    picked.update(random.Random(seed).sample(middle, min(random_blocks, len(middle))))
+    return sorted(picked)
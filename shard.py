@@ -0,0 +1,147 @@
+"""
+shard.py
+Split --verify-all across processes or machines and merge the results.
+
+Entries are assigned to shard ``blake2b(path) % N``, so every node computes
+the same partition from the same baseline with no coordination. Each shard
+writes a partial result file (NDJSON: a header line, one {"path", "status"}
+line per entry, then a summary line), and merge_results() folds any number of
+them into one report, noting shards that are missing, duplicated or cut
+short. run_local() drives N worker processes on one box the same way.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import time
+
+from baseline_format import NdjsonWriter
+
+STATUSES = ["ORIGINAL", "MODIFIED", "MISSING", "ERROR"]
+# Statuses that are not reported as problems (TRIAGED: sampled chunks matched)
+OK_STATUSES = {"ORIGINAL", "TRIAGED"}
+
+def parse_shard(text):
+    """argparse type for "i/N" (0 <= i < N)."""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {text!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must satisfy 0 <= i < N, got {text!r}")
+    return index, count
+
+def shard_of(path, count):
+    # Unpersonalised, unlike sampling.bucket_of, so shards and sample buckets do not line up
+    digest = hashlib.blake2b(path.encode("utf-8", "surrogateescape"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+class ResultWriter(NdjsonWriter):
+    """Partial result file for one shard; renamed into place only on a clean close."""
+
+    def __init__(self, path, shard, baseline):
+        super().__init__(path)
+        index, count = shard
+        self.counts = dict.fromkeys(STATUSES, 0)
+        self.started = time.time()
+        super().write({"shard": index, "shards": count, "baseline": baseline, "started": self.started})
+
+    def add(self, path, status):
+        self.counts[status] = self.counts.get(status, 0) + 1
+        super().write({"path": path, "status": status})
+
+    def close(self, commit=True):
+        if commit and self.f is not None:
+            super().write({"summary": self.counts, "seconds": round(time.time() - self.started, 3)})
+        super().close(commit)
+
+def read_results(path):
+    """Return (header, rows iterator, summary holder) for one partial result file.
+
+    The summary holder is a dict filled with the file's summary line once the
+    rows have been consumed; it stays empty if the shard was cut short.
+    """
+    f = open(path, "r", encoding="utf-8")
+    header = json.loads(f.readline() or "{}")
+    summary = {}
+
+    def rows():
+        with f:
+            for line in f:
+                record = json.loads(line)
+                if "summary" in record:
+                    summary.update(record)
+                    return
+                yield record
+
+    return header, rows(), summary
+
+def merge_results(paths, out=None):
+    """Fold partial result files into one report dict.
+
+    Every row is streamed to ``out`` (a merged NDJSON file) if given; only the
+    problem rows (not in OK_STATUSES) are kept in memory for the report.
+    """
+    counts = dict.fromkeys(STATUSES, 0)
+    problems = []
+    seen = {}
+    expected = None
+    incomplete = []
+    seconds = 0.0
+    writer = NdjsonWriter(out) if out else None
+    try:
+        for path in paths:
+            header, rows, summary = read_results(path)
+            index, count = header.get("shard"), header.get("shards")
+            if expected is None:
+                expected = count
+            elif count != expected:
+                raise ValueError(f"{path} is shard {index}/{count}, expected N={expected}")
+            if index in seen:
+                raise ValueError(f"shard {index} appears in both {seen[index]} and {path}")
+            seen[index] = path
+            for row in rows:
+                counts[row["status"]] = counts.get(row["status"], 0) + 1
+                if row["status"] not in OK_STATUSES:
+                    problems.append(row)
+                if writer:
+                    writer.write(row)
+            if not summary:
+                incomplete.append(index)
+            seconds = max(seconds, summary.get("seconds", 0.0))
+        if writer:
+            writer.write({"summary": counts, "shards": expected, "incomplete": incomplete})
+    except BaseException:
+        if writer:
+            writer.close(commit=False)
+        raise
+    if writer:
+        writer.close()
+    return {
+        "shards": expected,
+        "missing": sorted(set(range(expected or 0)) - set(seen)),
+        "incomplete": sorted(incomplete),
+        "counts": counts,
+        "total": sum(counts.values()),
+        "slowest_shard_seconds": seconds,
+        "problems": sorted(problems, key=lambda row: row["path"]),
+    }
+
+def run_local(command_for, count, workdir):
+    """Run ``count`` worker processes at once and return their result file paths.
+
+    ``command_for(index, result_path)`` returns the argv for one shard. Worker
+    stdout is discarded (the result files carry everything); a worker that
+    exits non-zero raises RuntimeError once all have finished.
+    """
+    paths = [os.path.join(workdir, f"shard-{i}-of-{count}.ndjson") for i in range(count)]
+    procs = [
+        subprocess.Popen(command_for(i, path), stdout=subprocess.DEVNULL)
+        for i, path in enumerate(paths)
+    ]
+    failed = [i for i, proc in enumerate(procs) if proc.wait() != 0]
+    if failed:
+        raise RuntimeError(f"shard worker(s) {', '.join(map(str, failed))} failed")
+    return paths
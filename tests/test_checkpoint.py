@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import Checkpoint
+
+OPTIONS = {"root": "/data", "algos": ["sha256"]}
+
+def crash(checkpoint, paths):
+    """Journal ``paths``, then die mid-way through writing the next record."""
+    for path in paths:
+        checkpoint.record({"path": path, "sha256": "00"})
+    checkpoint.sync()
+    checkpoint.f.write('{"path":"torn-')
+    checkpoint.f.flush()
+    checkpoint.f.close()
+    checkpoint.f = None
+
+class CheckpointResumeTest(unittest.TestCase):
+    def test_resume_after_two_torn_lines_keeps_every_record(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "baseline.ndjson.ckpt")
+
+            first = Checkpoint(path, OPTIONS)
+            self.assertEqual(first.open(resume=True), {})
+            crash(first, ["p0", "p1", "p2"])
+
+            second = Checkpoint(path, OPTIONS)
+            self.assertEqual(list(second.open(resume=True)), ["p0", "p1", "p2"])
+            crash(second, ["p4", "p5", "p6"])
+
+            third = Checkpoint(path, OPTIONS)
+            self.assertEqual(list(third.open(resume=True)), ["p0", "p1", "p2", "p4", "p5", "p6"])
+            third.close()
+
+if __name__ == "__main__":
+    unittest.main()
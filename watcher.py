@@ -0,0 +1,162 @@
+"""
+watcher.py
+inotify-driven watch loop for continuous integrity monitoring (Linux only).
+
+The parent directory of every baselined file is watched (so editors that save
+by rename are still seen). Events for baselined paths are coalesced per path
+and only handed to the worker pool once the path has been quiet for the
+debounce interval. When nothing changes the loop blocks in poll() and uses no
+CPU.
+"""
+
+import ctypes
+import ctypes.util
+import datetime
+import os
+import select
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF
+DEBOUNCE_SECONDS = 1.0
+
+_EVENT = struct.Struct("iIII")
+
+class Inotify:
+    """Minimal ctypes binding: add_watch() directories and read() (wd, mask, name) events."""
+
+    def __init__(self):
+        if not hasattr(os, "O_CLOEXEC") or not ctypes.util.find_library("c"):
+            raise OSError("--watch needs Linux inotify")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b"\0"))
+            pos += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class Watcher:
+    """Rehash baselined files after they change and report via ``report(path, status)``.
+
+    ``verify(entry)`` must return (path, status) like cli_checker.verify_entry.
+    At most ``jobs * 4`` rehashes are queued; beyond that the loop waits, and
+    if the kernel queue overflows meanwhile every watched file is rechecked.
+    """
+
+    def __init__(self, entries, verify, report=None, jobs=1, debounce=DEBOUNCE_SECONDS):
+        self.entries = {e["path"]: e for e in entries}
+        self.verify = verify
+        self.report = report or _print_report
+        self.jobs = max(1, jobs)
+        self.debounce = debounce
+        self.pending = {}
+        self.dirs = {}
+        self.inotify = Inotify()
+        self._slots = threading.BoundedSemaphore(self.jobs * 4)
+
+    def start(self):
+        for directory in sorted({os.path.dirname(p) for p in self.entries}):
+            try:
+                self.dirs[self.inotify.add_watch(directory)] = directory
+            except OSError as e:
+                print(f"Skip watch {directory}: {e}")
+        return len(self.dirs)
+
+    def _on_event(self, wd, mask, name, now):
+        if mask & IN_Q_OVERFLOW:
+            for path in self.entries:
+                self.pending[path] = now
+            return
+        if mask & IN_IGNORED:
+            self.dirs.pop(wd, None)
+            return
+        directory = self.dirs.get(wd)
+        if directory is None or not name:
+            return
+        path = os.path.join(directory, name)
+        if path in self.entries:
+            # Coalesce: a burst of writes to one file keeps pushing its deadline back
+            self.pending[path] = now
+
+    def _due(self, now):
+        due = [p for p, t in self.pending.items() if now - t >= self.debounce]
+        for path in due:
+            del self.pending[path]
+        return due
+
+    def _submit(self, pool, path):
+        self._slots.acquire()
+        future = pool.submit(self.verify, self.entries[path])
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        self._slots.release()
+        try:
+            path, status = future.result()
+        except Exception as e:
+            print(f"Watch error: {e}")
+            return
+        self.report(path, status)
+
+    def run(self, stop=None):
+        """Block until ``stop`` (a threading.Event) is set or Ctrl-C."""
+        poller = select.poll()
+        poller.register(self.inotify.fd, select.POLLIN)
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="watch") as pool:
+            try:
+                while stop is None or not stop.is_set():
+                    if self.pending:
+                        wait = max(0.0, min(self.pending.values()) + self.debounce - time.monotonic())
+                        timeout = int(wait * 1000) + 1
+                    else:
+                        timeout = None if stop is None else 500
+                    if poller.poll(timeout):
+                        now = time.monotonic()
+                        for wd, mask, name in self.inotify.read():
+                            self._on_event(wd, mask, name, now)
+                    for path in self._due(time.monotonic()):
+                        self._submit(pool, path)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.inotify.close()
+
+def _print_report(path, status):
+    stamp = datetime.datetime.now().isoformat(timespec="seconds")
+    marker = "" if status == "ORIGINAL" else "[ALERT] "
+    print(f"{stamp} {marker}{status} - {path}", flush=True)
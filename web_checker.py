@@ -1,57 +1,249 @@
-from flask import Flask, request, render_template_string, url_for, redirect, session, flash
+from flask import Flask, Request, Response, g, request, render_template, url_for, redirect, session, flash, jsonify, make_response
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import json
 import os
-import hashlib
 import datetime
+import hashlib
+import io
+import math
+import tempfile
+import threading
+import time
+try:
+    import fcntl
+except ImportError:  # Windows: hanya lock antar-thread
+    fcntl = None
+from collections import OrderedDict
+from functools import partial
+
+import metrics
+from baseline_store import BaselineStore, CLI_USER, DB_FILE, SORT_COLUMNS
+from hash_engine import SUPPORTED_ALGOS, HashingWriter, entry_algos, hash_file
+from job_queue import JobQueue
 
 app = Flask(__name__)
 app.secret_key = 'super-secret-key-change-me' 
 
 # --- KONFIGURASI ---
 UPLOAD_DIR = "uploads"
+# Isi upload disimpan sekali per sha256: uploads/objects/ab/abcdef...
+OBJECT_DIR = os.path.join(UPLOAD_DIR, "objects")
+CONTENT_ALGO = "sha256"
+# Upload sampai ukuran ini ditampung di memori dulu, jadi isi duplikat tidak pernah ditulis ke disk
+SPOOL_MEMORY_BYTES = 1024 * 1024
 BASELINE_FILE = "baseline.json"
 USERS_FILE = "users.json"
-HASH_ALGOS = ["md5", "sha1", "sha256"]
+# Algoritma hash bisa diatur lewat FIC_HASH_ALGOS, mis. "md5,sha1,sha256,blake2b"
+HASH_ALGOS = [a.strip() for a in os.environ.get("FIC_HASH_ALGOS", "md5,sha1,sha256").split(",") if a.strip()]
+_unknown_algos = [a for a in HASH_ALGOS if a not in SUPPORTED_ALGOS]
+if _unknown_algos or not HASH_ALGOS:
+    raise ValueError(f"FIC_HASH_ALGOS: unsupported algorithm(s) {', '.join(_unknown_algos) or '(none given)'}; "
+                     f"supported: {', '.join(SUPPORTED_ALGOS)}")
+# Jumlah worker untuk antrean job API, dan folder server yang boleh dicek lewat "paths"
+JOB_WORKERS = int(os.environ.get("FIC_JOB_WORKERS", os.cpu_count() or 1))
+ALLOWED_PATH_ROOTS = [
+    os.path.realpath(p) for p in os.environ.get("FIC_PATH_ROOTS", UPLOAD_DIR).split(os.pathsep) if p
+]
 
 # --- SETUP DIREKTORI ---
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+if not os.path.exists(OBJECT_DIR):
+    os.makedirs(OBJECT_DIR)
+
+job_queue = JobQueue(JOB_WORKERS)
 
 # --- FUNGSI HELPER UNTUK PENGGUNA ---
+# users.json di-cache di memori; dibaca ulang hanya jika file berubah (mtime/size/inode),
+# misalnya diubah worker gunicorn lain. Tulisan dari app sendiri langsung memperbarui cache.
+_users_lock = threading.Lock()
+_users_cache = {"stamp": None, "users": {}}
+
+def _users_stamp():
+    try:
+        st = os.stat(USERS_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
 def load_users():
-    if not os.path.exists(USERS_FILE):
-        return {}
-    with open(USERS_FILE, "r") as f:
-        return json.load(f)
+    # Hasilnya dipakai bersama; jangan diubah langsung, pakai add_user/save_users
+    stamp = _users_stamp()
+    with _users_lock:
+        if stamp != _users_cache["stamp"]:
+            users = {}
+            if stamp is not None:
+                with open(USERS_FILE, "r") as f:
+                    users = json.load(f)
+            _users_cache.update(stamp=stamp, users=users)
+        return _users_cache["users"]
 
-def save_users(users):
-    with open(USERS_FILE, "w") as f:
+class _UsersFileLock:
+    # Lock antar-proses (flock pada users.json.lock) di atas lock antar-thread
+    def __enter__(self):
+        _users_lock.acquire()
+        self.f = open(USERS_FILE + ".lock", "a")
+        if fcntl:
+            fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.f.close()
+        _users_lock.release()
+        return False
+
+def _write_users(users):
+    # Tulis ke file sementara lalu os.replace: pembaca tidak pernah melihat JSON setengah jadi
+    tmp = f"{USERS_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
         json.dump(users, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, USERS_FILE)
+    _users_cache.update(stamp=_users_stamp(), users=users)
+
+def save_users(users):
+    with _UsersFileLock():
+        _write_users(dict(users))
+
+def add_user(username, password_hash):
+    """Tambah user secara atomik; False jika username sudah ada (juga jika baru dibuat worker lain)."""
+    with _UsersFileLock():
+        users = {}
+        if os.path.exists(USERS_FILE):
+            with open(USERS_FILE, "r") as f:
+                users = json.load(f)
+        if username in users:
+            return False
+        users[username] = password_hash
+        _write_users(users)
+        return True
+
+# --- UPLOAD YANG DI-HASH SAAT STREAMING ---
+class SpooledUpload(HashingWriter):
+    """Upload stream that is hashed chunk by chunk while werkzeug parses the body.
+
+    Bytes are spooled only when the upload may be kept: in memory up to
+    SPOOL_MEMORY_BYTES, then in a temp file in UPLOAD_DIR. persist() moves them
+    into place, otherwise close() drops them. sha256 is always computed since
+    it is the key of the content store.
+    """
+
+    def __init__(self, spool=True):
+        algos = HASH_ALGOS if CONTENT_ALGO in HASH_ALGOS else HASH_ALGOS + [CONTENT_ALGO]
+        super().__init__(algos, io.BytesIO() if spool else None)
+
+    def write(self, data):
+        n = super().write(data)
+        if isinstance(self.sink, io.BytesIO) and self.sink.tell() > SPOOL_MEMORY_BYTES:
+            spooled = self.sink
+            self.sink = tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, prefix=".upload-", delete=False)
+            self.sink.write(spooled.getbuffer())
+        return n
+
+    def persist(self, dest):
+        if self.sink is None:
+            return False
+        if isinstance(self.sink, io.BytesIO):
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(dest), prefix=".upload-", delete=False) as f:
+                f.write(self.sink.getbuffer())
+            os.replace(f.name, dest)
+        else:
+            self.sink.close()
+            os.replace(self.sink.name, dest)
+        self.sink = None
+        return True
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+            if not isinstance(self.sink, io.BytesIO):
+                try:
+                    os.remove(self.sink.name)
+                except FileNotFoundError:
+                    pass
+            self.sink = None
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Tombol "Verify" mengirim ?action=verify, jadi upload cukup di-hash tanpa disimpan
+        return SpooledUpload(spool=self.args.get("action") != "verify")
+
+app.request_class = UploadRequest
 
 # --- FUNGSI HELPER UNTUK FILE INTEGRITY ---
-def calc_hash(path, algo="sha256", block_size=65536):
-    h = hashlib.new(algo)
-    with open(path, "rb") as f:
-        for block in iter(lambda: f.read(block_size), b""):
-            h.update(block)
-    return h.hexdigest()
-
-def load_baseline():
-    # Fungsi ini sekarang akan memuat dictionary, bukan list
-    if not os.path.exists(BASELINE_FILE):
-        return {} # Return dictionary kosong
+def calc_hash(path, algo="sha256"):
+    return hash_file(path, [algo])[algo]
+
+# Baseline disimpan di SQLite (app.db), diindeks per (user, filename) dan path
+baseline_store = BaselineStore(DB_FILE)
+
+def migrate_json_baseline():
+    # Impor baseline.json lama (format dict per user) sekali saja, selama belum ada baseline web.
+    # Baris CLI (username '', mis. dari --baseline app.db) tidak dihitung.
+    if any(user != CLI_USER for user in baseline_store.usernames()) or not os.path.exists(BASELINE_FILE):
+        return
     try:
         with open(BASELINE_FILE, "r", encoding="utf-8") as f:
             data = json.load(f)
-            # Pastikan data adalah dictionary untuk kompatibilitas
-            if isinstance(data, dict):
-                return data
-            else:
-                return {} # Jika format lama (list), anggap kosong
     except (json.JSONDecodeError, FileNotFoundError):
-        return {}
+        return
+    if isinstance(data, dict):
+        for user, entries in data.items():
+            baseline_store.upsert(entries, user)
+
+migrate_json_baseline()
+
+class UploadNotKept(Exception):
+    pass
+
+def object_path(sha256):
+    return os.path.join(OBJECT_DIR, sha256[:2], sha256)
+
+def _remove_object(sha256):
+    try:
+        os.remove(object_path(sha256))
+    except FileNotFoundError:
+        pass
+
+def record_upload(user, fname, upload):
+    # Baseline dari upload: isi disimpan content-addressed (sha256) dengan refcount per entri.
+    # Isi yang sudah dikenal tidak disimpan lagi, cukup refcount-nya yang naik.
+    digests = upload.hexdigests()
+    sha256 = digests[CONTENT_ALGO]
+
+    def store(known):
+        dest = object_path(sha256)
+        if known and os.path.exists(dest):
+            upload.close()
+            metrics.inc("fic_upload_dedup_total")
+            return
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with metrics.timed("upload_persist"):
+            if not upload.persist(dest):
+                raise UploadNotKept(fname)
+        metrics.inc("fic_upload_stored_bytes_total", upload.hasher.nbytes)
+
+    entry = {
+        "path": os.path.abspath(os.path.join(UPLOAD_DIR, fname)),
+        **{a: digests[a] for a in HASH_ALGOS},
+        "size": upload.hasher.nbytes,
+        "blob": sha256,
+        "timestamp": datetime.datetime.now().isoformat(),
+    }
+    with metrics.timed("baseline_write"):
+        baseline_store.record_upload(user, entry, store, _remove_object)
+
+def verify_hashes(user, fname, hashes, path=None):
+    # Cari file HANYA di baseline milik pengguna ini (per path dulu jika ada, lalu per nama file)
+    with metrics.timed("baseline_lookup"):
+        matched_entry = baseline_store.get_by_path(path, user) if path else None
+        if matched_entry is None:
+            matched_entry = baseline_store.get_by_filename(fname, user)
+    # Bandingkan hanya algoritma yang ada di kedua sisi (baseline lama bisa memakai set berbeda)
+    common = [a for a in entry_algos(matched_entry) if a in hashes] if matched_entry else []
+    if not common:
+        return "NOT IN BASELINE FOR THIS USER"
+    return "ORIGINAL" if all(hashes[a] == matched_entry[a] for a in common) else "MODIFIED"
 
 # --- TEMPLATE HTML (Tidak ada perubahan pada template, jadi saya persingkat) ---
 LOGIN_TEMPLATE = """...""" # Tidak berubah
@@ -157,27 +349,35 @@ DASHBOARD_TEMPLATE = """
   <main class="flex-1 container mx-auto px-6 py-8">
     <div class="bg-gray-800 shadow-lg rounded-2xl p-8 w-full border border-gray-700">
         <h2 class="text-2xl font-semibold mb-6 text-center text-gray-200">My Generated File Baselines</h2>
+        <form method="get" class="flex space-x-2 mb-4">
+            <input type="text" name="q" value="{{ q }}" placeholder="Search filename..." class="flex-1 bg-gray-700 border border-gray-600 rounded-lg px-3 py-2 text-sm focus:ring-indigo-500 focus:border-indigo-500">
+            <input type="hidden" name="sort" value="{{ sort }}">
+            <input type="hidden" name="order" value="{{ order }}">
+            <input type="hidden" name="per_page" value="{{ per_page }}">
+            <button type="submit" class="bg-indigo-600 text-white px-4 py-2 rounded-lg hover:bg-indigo-700 transition text-sm">Search</button>
+        </form>
+        <p class="text-sm text-gray-500 mb-2">{{ total }} baseline{{ '' if total == 1 else 's' }}{% if q %} matching "{{ q }}"{% endif %}</p>
         <div class="overflow-x-auto">
             <table class="w-full text-sm text-left text-gray-400">
                 <thead class="text-xs text-gray-300 uppercase bg-gray-700">
                     <tr>
                         <th scope="col" class="px-6 py-3">#</th>
-                        <th scope="col" class="px-6 py-3">Filename</th>
-                        <th scope="col" class="px-6 py-3">Date Generated</th>
-                        <th scope="col" class="px-6 py-3">Hashes (md5, sha1, sha256)</th>
+                        <th scope="col" class="px-6 py-3"><a href="{{ url_for('dashboard', q=q, per_page=per_page, sort='filename', order='desc' if sort == 'filename' and order == 'asc' else 'asc') }}" class="hover:text-indigo-400">Filename{% if sort == 'filename' %} {{ '▲' if order == 'asc' else '▼' }}{% endif %}</a></th>
+                        <th scope="col" class="px-6 py-3"><a href="{{ url_for('dashboard', q=q, per_page=per_page, sort='timestamp', order='asc' if sort == 'timestamp' and order == 'desc' else 'desc') }}" class="hover:text-indigo-400">Date Generated{% if sort == 'timestamp' %} {{ '▲' if order == 'asc' else '▼' }}{% endif %}</a></th>
+                        <th scope="col" class="px-6 py-3">Hashes ({{ hash_algos|join(', ') }})</th>
                     </tr>
                 </thead>
                 <tbody>
                 {% for item in baseline_data %}
                     <tr class="bg-gray-800 border-b border-gray-700 hover:bg-gray-700">
-                        <td class="px-6 py-4 font-medium">{{ loop.index }}</td>
+                        <td class="px-6 py-4 font-medium">{{ offset + loop.index }}</td>
                         <td class="px-6 py-4 font-medium text-white">{{ item.filename }}</td>
                         <td class="px-6 py-4">{{ item.timestamp }}</td>
                         <td class="px-6 py-4 font-mono text-xs">
                             <div class="flex flex-col space-y-1">
-                                <span><strong class="text-sky-400">MD5:</strong> {{ item.hashes.md5 or 'N/A' }}</span>
-                                <span><strong class="text-amber-400">SHA1:</strong> {{ item.hashes.sha1 or 'N/A' }}</span>
-                                <span><strong class="text-emerald-400">SHA256:</strong> {{ item.hashes.sha256 or 'N/A' }}</span>
+                                {% for algo, h in item.hashes.items() %}
+                                <span><strong class="{{ loop.cycle('text-sky-400', 'text-amber-400', 'text-emerald-400') }}">{{ algo|upper }}:</strong> {{ h or 'N/A' }}</span>
+                                {% endfor %}
                             </div>
                         </td>
                     </tr>
@@ -191,6 +391,13 @@ DASHBOARD_TEMPLATE = """
                 </tbody>
             </table>
         </div>
+        {% if pages > 1 %}
+        <div class="flex justify-between items-center mt-4 text-sm">
+            {% if page > 1 %}<a href="{{ url_for('dashboard', q=q, sort=sort, order=order, page=page - 1, per_page=per_page) }}" class="px-3 py-1 rounded bg-gray-700 hover:bg-gray-600">&larr; Prev</a>{% else %}<span></span>{% endif %}
+            <span class="text-gray-500">Page {{ page }} of {{ pages }}</span>
+            {% if page < pages %}<a href="{{ url_for('dashboard', q=q, sort=sort, order=order, page=page + 1, per_page=per_page) }}" class="px-3 py-1 rounded bg-gray-700 hover:bg-gray-600">Next &rarr;</a>{% else %}<span></span>{% endif %}
+        </div>
+        {% endif %}
     </div>
   </main>
   <footer class="bg-gray-800 border-t border-gray-700 mt-8">
@@ -245,8 +452,8 @@ MAIN_TEMPLATE = """
           </div>
           <div id="preview" class="mt-4 flex flex-col items-center space-y-2"></div>
           <div class="flex space-x-4">
-            <button name="action" value="verify" class="flex-1 bg-primary-600 text-white py-2 px-4 rounded-lg shadow hover:bg-primary-700 transition">Verify File</button>
-            <button name="action" value="generate" class="flex-1 bg-green-600 text-white py-2 px-4 rounded-lg shadow hover:bg-green-700 transition">Generate Baseline</button>
+            <button name="action" value="verify" formaction="{{ url_for('index', action='verify') }}" class="flex-1 bg-primary-600 text-white py-2 px-4 rounded-lg shadow hover:bg-primary-700 transition">Verify File</button>
+            <button name="action" value="generate" formaction="{{ url_for('index', action='generate') }}" class="flex-1 bg-green-600 text-white py-2 px-4 rounded-lg shadow hover:bg-green-700 transition">Generate Baseline</button>
           </div>
         </form>
       {% else %}
@@ -281,6 +488,17 @@ MAIN_TEMPLATE = """
 </html>
 """
 
+# Template dikompilasi sekali saat start; render_template_string mengkompilasi ulang setiap request
+TEMPLATES = {
+    name: app.jinja_env.from_string(source)
+    for name, source in {
+        'login': LOGIN_TEMPLATE,
+        'register': REGISTER_TEMPLATE,
+        'dashboard': DASHBOARD_TEMPLATE,
+        'main': MAIN_TEMPLATE,
+    }.items()
+}
+
 # --- RUTE (ROUTES) APLIKASI ---
 
 @app.route("/register", methods=["GET", "POST"])
@@ -290,16 +508,15 @@ def register():
     if request.method == "POST":
         username = request.form["username"]
         password = request.form["password"]
-        users = load_users()
-        if username in users:
+        if username in load_users():
+            flash("Username already exists.", "error")
+            return redirect(url_for('register'))
+        if not add_user(username, generate_password_hash(password)):
             flash("Username already exists.", "error")
             return redirect(url_for('register'))
-        hashed_password = generate_password_hash(password)
-        users[username] = hashed_password
-        save_users(users)
         flash("Registration successful! Please login.", "success")
         return redirect(url_for('login'))
-    return render_template_string(REGISTER_TEMPLATE)
+    return render_template(TEMPLATES['register'])
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
@@ -314,7 +531,7 @@ def login():
             return redirect(url_for('login'))
         session['username'] = username
         return redirect(url_for('index'))
-    return render_template_string(LOGIN_TEMPLATE)
+    return render_template(TEMPLATES['login'])
 
 @app.route("/logout")
 def logout():
@@ -322,40 +539,86 @@ def logout():
     flash("You have been logged out.", "success")
     return redirect(url_for('login'))
 
+# --- CACHE DASHBOARD ---
+# Halaman dashboard yang sudah diproses disimpan per (user, versi baseline, parameter).
+# Versi dinaikkan di database setiap kali user generate baseline, jadi cache lama
+# otomatis tidak terpakai lagi, juga di worker gunicorn lain.
+DASHBOARD_PER_PAGE = 50
+DASHBOARD_CACHE_SIZE = 256
+_dashboard_cache = OrderedDict()
+_dashboard_cache_lock = threading.Lock()
+
+def format_timestamp(timestamp_str):
+    if not timestamp_str:
+        return "Unknown"
+    try:
+        return datetime.datetime.fromisoformat(timestamp_str).strftime('%Y-%m-%d %H:%M:%S')
+    except (ValueError, TypeError):
+        return timestamp_str
+
+def dashboard_view(user, version, q, sort, descending, page, per_page):
+    key = (user, version, q, sort, descending, page, per_page)
+    with _dashboard_cache_lock:
+        if key in _dashboard_cache:
+            _dashboard_cache.move_to_end(key)
+            return _dashboard_cache[key]
+    entries, total = baseline_store.page(user, q, sort, descending, per_page, (page - 1) * per_page)
+    view = {
+        'rows': [{
+            'filename': os.path.basename(entry.get('path', 'Unknown File')),
+            'timestamp': format_timestamp(entry.get('timestamp')),
+            # Algoritma yang tercatat di entri (bisa beda dengan FIC_HASH_ALGOS saat ini)
+            'hashes': {algo: entry[algo] for algo in entry_algos(entry)} or {algo: None for algo in HASH_ALGOS}
+        } for entry in entries],
+        'total': total,
+        'pages': max(1, math.ceil(total / per_page)),
+    }
+    with _dashboard_cache_lock:
+        _dashboard_cache[key] = view
+        while len(_dashboard_cache) > DASHBOARD_CACHE_SIZE:
+            _dashboard_cache.popitem(last=False)
+    return view
+
 @app.route("/dashboard")
 def dashboard():
     if 'username' not in session:
         return redirect(url_for('login'))
 
     current_user = session['username']
-    all_baselines = load_baseline()
-    
-    # Ambil baseline HANYA untuk pengguna yang sedang login
-    user_baseline = all_baselines.get(current_user, [])
-    
-    processed_baseline = []
-    for entry in user_baseline:
-        timestamp_str = entry.get('timestamp') 
-        formatted_timestamp = "Unknown"
-        if timestamp_str:
-            try:
-                timestamp_obj = datetime.datetime.fromisoformat(timestamp_str)
-                formatted_timestamp = timestamp_obj.strftime('%Y-%m-%d %H:%M:%S')
-            except (ValueError, TypeError):
-                formatted_timestamp = timestamp_str
-        processed_baseline.append({
-            'filename': os.path.basename(entry.get('path', 'Unknown File')),
-            'timestamp': formatted_timestamp,
-            'hashes': { 'md5': entry.get('md5'), 'sha1': entry.get('sha1'), 'sha256': entry.get('sha256') }
-        })
-    
-    processed_baseline.sort(key=lambda x: x['timestamp'], reverse=True)
-
-    return render_template_string(
-        DASHBOARD_TEMPLATE,
-        baseline_data=processed_baseline,
-        year=datetime.datetime.now().year
-    )
+    q = request.args.get('q', '').strip()
+    sort = request.args.get('sort', 'timestamp')
+    if sort not in SORT_COLUMNS:
+        sort = 'timestamp'
+    order = 'asc' if request.args.get('order') == 'asc' else 'desc'
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(200, max(1, request.args.get('per_page', DASHBOARD_PER_PAGE, type=int)))
+    year = datetime.datetime.now().year
+
+    # ETag dari versi baseline user + parameter halaman: jika tidak berubah, balas 304
+    version = baseline_store.version(current_user)
+    etag = hashlib.sha1(json.dumps([current_user, version, q, sort, order, page, per_page, year]).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        view = dashboard_view(current_user, version, q, sort, order == 'desc', page, per_page)
+        with metrics.timed("render"):
+            response = make_response(render_template(
+                TEMPLATES['dashboard'],
+                baseline_data=view['rows'],
+                total=view['total'],
+                pages=view['pages'],
+                page=page,
+                offset=(page - 1) * per_page,
+                per_page=per_page,
+                q=q,
+                sort=sort,
+                order=order,
+                hash_algos=HASH_ALGOS,
+                year=year
+            ))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route("/", methods=["GET", "POST"])
 def index():
@@ -365,58 +628,159 @@ def index():
     current_user = session['username']
 
     if request.method == "POST":
-        action = request.form.get("action")
-        file = request.files.get("file")
+        action = request.args.get("action") or request.form.get("action")
+        # Body dibaca dan di-hash di sini (lihat SpooledUpload)
+        with metrics.timed("upload_stream"):
+            file = request.files.get("file")
         
         if not file or file.filename == '':
             flash("You must select a file before submitting.", "error")
             return redirect(url_for('index'))
 
         fname = secure_filename(file.filename)
-        save_path = os.path.join(UPLOAD_DIR, fname)
-        file.save(save_path)
 
-        hashes = {algo: calc_hash(save_path, algo) for algo in HASH_ALGOS}
-
-        all_baselines = load_baseline()
-        user_baseline = all_baselines.get(current_user, [])
+        # Hash sudah dihitung selama upload di-stream (lihat SpooledUpload)
+        hashes = _take_upload(file)
 
         if action == "generate":
-            new_entry = {
-                "path": os.path.abspath(save_path),
-                **hashes,
-                "timestamp": datetime.datetime.now().isoformat()
-            }
-            # Hapus entri lama dari baseline pengguna ini saja
-            user_baseline = [e for e in user_baseline if os.path.basename(e.get("path", "")) != fname]
-            user_baseline.append(new_entry)
-            
-            # Update data untuk pengguna ini di dictionary utama
-            all_baselines[current_user] = user_baseline
-
-            # Simpan seluruh data kembali ke file
-            with open(BASELINE_FILE, "w", encoding="utf-8") as f:
-                json.dump(all_baselines, f, indent=2)
-
+            try:
+                record_upload(current_user, fname, file.stream)
+            except UploadNotKept:
+                flash("Upload was not kept; please generate the baseline again.", "error")
+                return redirect(url_for('index'))
             status = "BASELINE GENERATED"
         else: # action == 'verify'
-            # Cari file HANYA di baseline milik pengguna ini
-            matched_entry = next((e for e in user_baseline if os.path.basename(e.get("path", "")) == fname), None)
-            if matched_entry:
-                status = "ORIGINAL" if all(hashes[a] == matched_entry.get(a) for a in HASH_ALGOS) else "MODIFIED"
-            else:
-                status = "NOT IN BASELINE FOR THIS USER"
-
-        return render_template_string(
-            MAIN_TEMPLATE,
-            result=True,
-            fname=fname,
-            hashes=hashes,
-            status=status,
-            year=datetime.datetime.now().year,
-        )
-
-    return render_template_string(MAIN_TEMPLATE, result=False, year=datetime.datetime.now().year)
+            status = verify_hashes(current_user, fname, hashes)
+
+        with metrics.timed("render"):
+            return render_template(
+                TEMPLATES['main'],
+                result=True,
+                fname=fname,
+                hashes=hashes,
+                status=status,
+                year=datetime.datetime.now().year,
+            )
+
+    return render_template(TEMPLATES['main'], result=False, year=datetime.datetime.now().year)
+
+# --- METRIK ---
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        metrics.observe("fic_request_seconds", time.perf_counter() - start,
+                        endpoint=request.endpoint or "unknown", method=request.method)
+    return response
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+# --- API BATCH (JSON) ---
+# POST /api/jobs menerima banyak file ("files") dan/atau path di server ("paths"),
+# langsung mengembalikan job_id. File upload sudah di-hash di thread request saat di-stream;
+# worker pool hanya mencocokkan baseline untuk upload, dan meng-hash file untuk "paths".
+# Job dan hasilnya disimpan di app.db, jadi polling/stream bisa dilayani worker gunicorn mana pun.
+
+def _upload_task(user, action, fname, hashes):
+    # Hash upload sudah dihitung saat streaming dan "generate" sudah disimpan di request
+    # (lihat record_upload); di sini hanya verify
+    status = "BASELINE GENERATED" if action == "generate" else verify_hashes(user, fname, hashes)
+    return {"name": fname, "status": status, "hashes": hashes}
+
+def _path_allowed(path):
+    return any(os.path.commonpath([root, path]) == root for root in ALLOWED_PATH_ROOTS)
+
+def _path_task(user, action, raw_path):
+    path = os.path.realpath(raw_path)
+    if not _path_allowed(path):
+        return {"name": raw_path, "status": "ERROR", "error": "path is outside the allowed roots"}
+    if not os.path.isfile(path):
+        return {"name": raw_path, "status": "MISSING"}
+    hashes = hash_file(path, HASH_ALGOS)
+    if action == "generate":
+        baseline_store.upsert([{"path": path, **hashes, "timestamp": datetime.datetime.now().isoformat()}], user)
+        status = "BASELINE GENERATED"
+    else:
+        status = verify_hashes(user, os.path.basename(path), hashes, path)
+    return {"name": raw_path, "status": status, "hashes": hashes}
+
+def _take_upload(file):
+    # Hitung upload yang sudah di-hash selama streaming ke metrik
+    metrics.record_file(file.filename, 0.0, file.stream.hasher.nbytes)
+    digests = file.stream.hexdigests()
+    return {a: digests[a] for a in HASH_ALGOS}
+
+def _api_user():
+    return session.get('username')
+
+@app.route("/api/jobs", methods=["POST"])
+def api_create_job():
+    current_user = _api_user()
+    if not current_user:
+        return jsonify(error="login required"), 401
+    payload = request.get_json(silent=True) or {}
+    action = request.args.get("action") or request.form.get("action") or payload.get("action") or "verify"
+    if action not in ("verify", "generate"):
+        return jsonify(error="action must be 'verify' or 'generate'"), 400
+
+    tasks = []
+    for file in request.files.getlist("files"):
+        if not file.filename:
+            continue
+        fname = secure_filename(file.filename)
+        hashes = _take_upload(file)
+        if action == "generate":
+            try:
+                record_upload(current_user, fname, file.stream)
+            except UploadNotKept:
+                return jsonify(error="generate uploads must not be sent with ?action=verify"), 400
+        tasks.append(partial(_upload_task, current_user, action, fname, hashes))
+    for raw_path in payload.get("paths") or request.form.getlist("paths"):
+        tasks.append(partial(_path_task, current_user, action, raw_path))
+    if not tasks:
+        return jsonify(error="send files in 'files' or server paths in 'paths'"), 400
+
+    job = job_queue.submit(current_user, tasks)
+    return jsonify(
+        job_id=job.id,
+        total=job.total,
+        status_url=url_for('api_job_status', job_id=job.id),
+        stream_url=url_for('api_job_stream', job_id=job.id),
+    ), 202
+
+@app.route("/api/jobs/<job_id>")
+def api_job_status(job_id):
+    job = job_queue.get(job_id, _api_user())
+    if job is None:
+        return jsonify(error="job not found"), 404
+    return jsonify(job.snapshot(request.args.get("since", 0, type=int)))
+
+@app.route("/api/jobs/<job_id>/stream")
+def api_job_stream(job_id):
+    job = job_queue.get(job_id, _api_user())
+    if job is None:
+        return jsonify(error="job not found"), 404
+
+    def generate():
+        # Satu baris JSON per file, dikirim begitu hasilnya selesai
+        seen = 0
+        while seen < job.total:
+            for result in job.wait_for(seen, timeout=15):
+                seen += 1
+                yield json.dumps(result) + "\n"
+            if seen < job.total and job.expired:
+                # Worker yang memproses job mati/restart: jangan menunggu selamanya
+                yield json.dumps({"status": "ERROR", "error": "job did not finish before its deadline",
+                                  "completed": seen, "total": job.total}) + "\n"
+                return
+
+    return Response(generate(), mimetype="application/x-ndjson")
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file